@@ -227,7 +227,10 @@ class Dev(Configuration):
 
     SESSION_ENGINE = "django.contrib.sessions.backends.db"
 
-    CACHE_TTL = 900
+    # Cached API responses are keyed by the catalog version, bumped by populate_db
+    CACHE_TTL = 60 * 60 * 6
+    # Seconds between two reads of the catalog version by each worker thread
+    CATALOG_VERSION_TTL = 5
 
     CACHES = {
         "default": {
@@ -407,6 +410,10 @@ class Test(Dev):
         return "http://localhost:8000/mock-frontend/auth-callback/"
 
 
+class TestPostgres(Test):
+    DATABASES = values.DatabaseURLValue(environ_prefix=Test.NAME)
+
+
 class Prod(Dev):
     NAME = "PROD"
     DOTENV = Dev.BASE_DIR / ".env.prod"
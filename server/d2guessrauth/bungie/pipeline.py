@@ -8,7 +8,7 @@ from social_core.pipeline.partial import partial
 
 from d2guessrauth.bungie.oauth_client import BungieClient
 from d2guessrauth.models import BungieAccount, BungieUser
-from d2guessrlib.models import Item
+from d2guessrlib.models import ItemHashAlias
 
 logger = logging.getLogger("auth_pipeline")
 
@@ -208,12 +208,15 @@ def create_or_update_bungie_account_inventory(strategy, response, user=None, *ar
 
 def _add_items_to_account(inventory_set_data, bungie_account):
     item_hashes = {item["itemHash"] for item in inventory_set_data}
-    item_objs = Item.objects.filter(id_bungie__in=item_hashes)
-    item_map = {item.id_bungie: item for item in item_objs}
+    # Reissues and variants of an item have their own hashes, all resolved to the imported item
+    aliases = ItemHashAlias.objects.filter(hash__in=item_hashes).select_related("item")
+    item_map = {alias.hash: alias.item for alias in aliases}
 
-    existing_item_ids = set(bungie_account.items.filter(id_bungie__in=item_hashes).values_list("id_bungie", flat=True))
+    existing_item_ids = set(
+        bungie_account.items.filter(pk__in=[item.pk for item in item_map.values()]).values_list("pk", flat=True)
+    )
 
-    new_items = []
+    new_items = {}
     for item in inventory_set_data:
         item_hash = item["itemHash"]
         if item_hash not in item_map:
@@ -224,22 +227,23 @@ def _add_items_to_account(inventory_set_data, bungie_account):
             )
             continue
 
-        if item_hash in existing_item_ids:
+        item_obj = item_map[item_hash]
+        if item_obj.pk in existing_item_ids:
             logger.warning(
                 "Item %s already in destiny account %s",
-                item_map[item_hash],
+                item_obj,
                 bungie_account,
             )
-        else:
+        elif item_obj.pk not in new_items:
             logger.info(
                 "Adding item %s to destiny account %s",
-                item_map[item_hash],
+                item_obj,
                 bungie_account,
             )
-            new_items.append(item_map[item_hash])
+            new_items[item_obj.pk] = item_obj
 
     if new_items:
-        bungie_account.items.add(*new_items)
+        bungie_account.items.add(*new_items.values())
 
     return len(new_items)
 
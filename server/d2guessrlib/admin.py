@@ -6,9 +6,12 @@ from d2guessrlib.models import (
     ClassType,
     ContentTranslation,
     DamageType,
+    IngestionRun,
     Item,
+    ItemHashAlias,
     ItemStat,
     ItemTranslation,
+    ManifestVersion,
     Perk,
     Season,
     StatType,
@@ -67,6 +70,12 @@ class ItemAdmin(admin.ModelAdmin):
     )
 
 
+@admin.register(ItemHashAlias)
+class ItemHashAliasAdmin(admin.ModelAdmin):
+    list_display = ("hash", "item")
+    search_fields = ("hash", "item__api_name")
+
+
 @admin.register(ItemTranslation)
 class ItemTranslationAdmin(admin.ModelAdmin):
     list_display = ("name", "language")
@@ -89,3 +98,16 @@ class SeasonAdmin(admin.ModelAdmin):
 @admin.register(Perk)
 class PerkAdmin(admin.ModelAdmin):
     list_display = ("name",)
+
+
+@admin.register(ManifestVersion)
+class ManifestVersionAdmin(admin.ModelAdmin):
+    list_display = ("version", "imported_at")
+    search_fields = ("version",)
+
+
+@admin.register(IngestionRun)
+class IngestionRunAdmin(admin.ModelAdmin):
+    list_display = ("started_at", "status", "seconds", "manifest_version")
+    list_filter = ("status",)
+    readonly_fields = ("started_at", "seconds", "status", "manifest_version", "options", "phases", "critical_path")
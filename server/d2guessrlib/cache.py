@@ -0,0 +1,57 @@
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.views.decorators.cache import cache_page
+
+from d2guessrlib.models import CatalogVersion
+
+_local = threading.local()
+_cached_views_lock = threading.Lock()
+
+
+def catalog_version():
+    """
+    Return the published catalog version, read from the database at most every CATALOG_VERSION_TTL seconds
+    per thread.
+    """
+    now = time.monotonic()
+    if getattr(_local, "expires_at", 0) <= now:
+        _local.version = CatalogVersion.current()
+        _local.expires_at = now + settings.CATALOG_VERSION_TTL
+    return _local.version
+
+
+def forget_catalog_version():
+    """
+    Read the catalog version from the database on the next request of this thread.
+    """
+    _local.expires_at = 0
+
+
+def catalog_cache_page(timeout):
+    """
+    Like `cache_page`, with cache keys prefixed by the catalog version.
+
+    Publishing a new catalog bumps the version, so every worker stops serving the previous responses
+    as soon as it reads the new version, whatever `timeout` is.
+    """
+
+    def decorator(view_func):
+        cached_views = {}
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            version = catalog_version()
+            cached_view = cached_views.get(version)
+            if cached_view is None:
+                cached_view = cache_page(timeout, key_prefix=f"catalog-{version}")(view_func)
+                with _cached_views_lock:
+                    cached_views.clear()
+                    cached_views[version] = cached_view
+            return cached_view(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
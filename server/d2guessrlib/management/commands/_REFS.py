@@ -2,12 +2,19 @@ class HashMapping:
     def __init__(self, data):
         assert isinstance(data, dict)
         self._data = data
+        # Built once, the mappings are never changed
+        self._keys = tuple(data.keys())
+        self._values = tuple(data.values())
+        self.hashes = frozenset(self._values)
 
     def get_values(self):
-        return tuple(self._data.values())
+        return self._values
 
     def get_keys(self):
-        return tuple(self._data.keys())
+        return self._keys
+
+    def items(self):
+        return tuple(self._data.items())
 
     def __getitem__(self, key):
         return self._data[key]
@@ -118,31 +125,36 @@ ITEM_CATEGORY_HM = CATEGORY_SLOT_HM.reverse()
 ITEM_CATEGORY_HM.update(CLASS_HM.reverse())
 
 
-def classify_item(item_category_hashes, class_type=None):
-    item_info = {"itemTypeHash": None, "categoryHash": None, "classHash": None, "weaponSlotHash": None}
+ITEM_TYPE_HASHES = frozenset((CATEGORY_SLOT_HM["Weapon"], CATEGORY_SLOT_HM["Armor"]))
 
-    # Identify type first
-    for h in item_category_hashes:
-        if h == 1:
-            item_info["itemTypeHash"] = h
-            break
+WEAPON_SLOT_HASHES = frozenset((CATEGORY_SLOT_HM["Kinetic"], CATEGORY_SLOT_HM["Energy"], CATEGORY_SLOT_HM["Power"]))
 
-        if h == 20:
-            item_info["itemTypeHash"] = h
-            break
+# Key of the classification set by each item category hash
+ITEM_CATEGORY_ROLES = {
+    **{h: "categoryHash" for h in CATEGORY_SLOT_HM.get_values()},
+    **{h: "weaponSlotHash" for h in WEAPON_SLOT_HASHES},
+    **{h: "classHash" for h in CLASS_HM.get_values()},
+    **{h: "itemTypeHash" for h in ITEM_TYPE_HASHES},
+}
 
-    # Then category and weapon slot
 
-    for h in item_category_hashes:
-        if h in (1, 20):
-            continue
-        label = ITEM_CATEGORY_HM.get(h)
-        if label:
-            if label in ["Titan", "Hunter", "Warlock"]:
-                item_info["classHash"] = h
-            elif label in ["Kinetic", "Energy", "Power"]:
-                item_info["weaponSlotHash"] = h
-            else:
-                item_info["categoryHash"] = h
+def classify_item(item_category_hashes, class_type=None):
+    """
+    Find the item type, category, class and weapon slot hashes among the category hashes of an item.
 
+    The first item type found is kept, the last category, class and weapon slot found otherwise.
+    """
+    item_info = {"itemTypeHash": None, "categoryHash": None, "classHash": None, "weaponSlotHash": None}
+    for h in item_category_hashes or ():
+        role = ITEM_CATEGORY_ROLES.get(h)
+        if role is None or (role == "itemTypeHash" and item_info[role] is not None):
+            continue
+        item_info[role] = h
     return item_info
+
+
+def classify_items(items_category_hashes):
+    """
+    Classify a batch of items given the category hashes of each one, see `classify_item`.
+    """
+    return [classify_item(item_category_hashes) for item_category_hashes in items_category_hashes]
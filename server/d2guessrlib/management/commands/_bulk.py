@@ -0,0 +1,304 @@
+import io
+import json
+import logging
+import time
+
+from django.db import connection as default_connection
+from django.db import models, transaction
+
+logger = logging.getLogger("populate_db")
+
+DEFAULT_BATCH_SIZE = 500
+
+
+def chunked(values, size):
+    """
+    Split a sequence into lists of at most `size` elements.
+    """
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start : start + size]
+
+
+class WriteStats:
+    """
+    Rows written and time spent for one model.
+    """
+
+    def __init__(self, label):
+        self.label = label
+        self.rows = 0
+        self.seconds = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        return f"{self.label}: {self.rows} rows in {self.seconds:.2f}s ({self.rows_per_second:.0f} rows/s)"
+
+
+class BulkWriter:
+    """
+    Write model rows with set-based upserts in chunked transactions.
+
+    Every write method takes all the rows of a model at once and sends them `batch_size` at a time,
+    each chunk in its own transaction. Time and row counts are kept per model.
+    """
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.stats = {}
+
+    def _record(self, label, rows, started):
+        stats = self.stats.setdefault(label, WriteStats(label))
+        stats.rows += rows
+        stats.seconds += time.perf_counter() - started
+
+    def upsert(self, model, objs, unique_fields, update_fields):
+        """
+        Insert `objs`, updating `update_fields` of the rows that conflict on `unique_fields`.
+        """
+        objs = list(objs)
+        for chunk in chunked(objs, self.batch_size):
+            started = time.perf_counter()
+            with transaction.atomic():
+                model.objects.bulk_create(
+                    chunk,
+                    update_conflicts=True,
+                    unique_fields=unique_fields,
+                    update_fields=update_fields,
+                )
+            self._record(model.__name__, len(chunk), started)
+        return len(objs)
+
+    def update(self, model, objs, fields):
+        """
+        Update `fields` of saved `objs`.
+        """
+        objs = list(objs)
+        for chunk in chunked(objs, self.batch_size):
+            started = time.perf_counter()
+            with transaction.atomic():
+                model.objects.bulk_update(chunk, fields)
+            self._record(model.__name__, len(chunk), started)
+        return len(objs)
+
+    def delete(self, model, field_name, values):
+        """
+        Delete the rows of `model` whose `field_name` is in `values`, cascading like `QuerySet.delete`.
+        """
+        deleted = 0
+        for chunk in chunked(values, self.batch_size):
+            started = time.perf_counter()
+            with transaction.atomic():
+                _, deleted_by_model = model.objects.filter(**{f"{field_name}__in": chunk}).delete()
+            rows = deleted_by_model.get(model._meta.label, 0)
+            self._record(model.__name__, rows, started)
+            deleted += rows
+        return deleted
+
+    def replace_m2m(self, relation, links):
+        """
+        Replace the through rows of a many-to-many relation.
+
+        `relation` is the model descriptor (e.g. `Item.perks`) and `links` maps a source pk to the
+        target pks it must be linked to. Sources missing from `links` are left untouched.
+        """
+        through = relation.through
+        source_column = relation.field.m2m_field_name() + "_id"
+        target_column = relation.field.m2m_reverse_field_name() + "_id"
+
+        written = 0
+        for source_ids in chunked(links, self.batch_size):
+            rows = [
+                through(**{source_column: source_id, target_column: target_id})
+                for source_id in source_ids
+                for target_id in set(links[source_id])
+            ]
+            started = time.perf_counter()
+            with transaction.atomic():
+                through.objects.filter(**{f"{source_column}__in": source_ids}).delete()
+                through.objects.bulk_create(rows, batch_size=self.batch_size, ignore_conflicts=True)
+            self._record(through.__name__, len(rows), started)
+            written += len(rows)
+        return written
+
+    def log_stats(self):
+        for stats in self.stats.values():
+            logger.info("Wrote %s", stats)
+
+
+def copy_line(values):
+    """
+    Format `values` as a line of the text format of Postgres COPY.
+    """
+    fields = []
+    for value in values:
+        if value is None:
+            fields.append("\\N")
+            continue
+        text = ("t" if value else "f") if isinstance(value, bool) else str(value)
+        fields.append(text.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r"))
+    return "\t".join(fields) + "\n"
+
+
+class CopyStream(io.TextIOBase):
+    """
+    Read-only file object over lines produced on demand, so rows are encoded while COPY sends them.
+    """
+
+    def __init__(self, lines):
+        self._lines = iter(lines)
+        self._buffer = ""
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while size is None or size < 0 or len(self._buffer) < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            self._buffer += line
+        if size is None or size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def readline(self, size=-1):
+        return self.read(size)
+
+
+class PostgresCopyWriter(BulkWriter):
+    """
+    BulkWriter streaming rows to Postgres with COPY instead of multi-row INSERT statements.
+
+    Each upsert copies all the rows of a model into a temporary table, then merges them with a single
+    INSERT ... ON CONFLICT, so the number of statements no longer depends on the number of rows.
+    The statements run in the current transaction, or in one of their own.
+    """
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, connection=default_connection):
+        super().__init__(batch_size=batch_size)
+        self.connection = connection
+
+    def _columns(self, model, field_names=None):
+        fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+        if field_names is not None:
+            fields = [model._meta.get_field(field_name) for field_name in field_names]
+        return fields
+
+    def _db_value(self, field, obj):
+        value = field.pre_save(obj, add=obj.pk is None)
+        if isinstance(field, models.JSONField):
+            return json.dumps(value, cls=field.encoder)
+        return field.get_db_prep_save(value, connection=self.connection)
+
+    def _copy(self, cursor, table, columns, rows):
+        quote = self.connection.ops.quote_name
+        sql = f"COPY {quote(table)} ({', '.join(quote(column) for column in columns)}) FROM STDIN"
+        lines = (copy_line(row) for row in rows)
+        if hasattr(cursor, "copy_expert"):
+            # psycopg2
+            cursor.copy_expert(sql, CopyStream(lines))
+        else:
+            with cursor.copy(sql) as copy:
+                for line in lines:
+                    copy.write(line)
+
+    def _copy_to_temp_table(self, cursor, model, fields, objs):
+        """
+        Copy the `fields` of `objs` to a temporary table shaped like the table of `model`, and return its name.
+        """
+        quote = self.connection.ops.quote_name
+        temp_table = f"copy_{model._meta.db_table}"
+        columns = [field.column for field in fields]
+        cursor.execute(f"DROP TABLE IF EXISTS {quote(temp_table)}")
+        cursor.execute(
+            f"CREATE TEMPORARY TABLE {quote(temp_table)} AS "
+            f"SELECT {', '.join(quote(column) for column in columns)} FROM {quote(model._meta.db_table)} WITH NO DATA"
+        )
+        self._copy(cursor, temp_table, columns, (self._row(fields, obj) for obj in objs))
+        return temp_table
+
+    def _row(self, fields, obj):
+        # Foreign keys to objects saved after `obj` was built (e.g. `ItemStat(item=item)`) are only set
+        # on `obj` when preparing it, as bulk_create does
+        obj._prepare_related_fields_for_save(operation_name="bulk_create")
+        return [self._db_value(field, obj) for field in fields]
+
+    def upsert(self, model, objs, unique_fields, update_fields):
+        objs = list(objs)
+        if not objs:
+            return 0
+        quote = self.connection.ops.quote_name
+        fields = self._columns(model)
+        columns = ", ".join(quote(field.column) for field in fields)
+        conflict = ", ".join(quote(model._meta.get_field(name).column) for name in unique_fields)
+        if update_fields:
+            updates = ", ".join(
+                f"{quote(column)} = EXCLUDED.{quote(column)}"
+                for column in (model._meta.get_field(name).column for name in update_fields)
+            )
+            on_conflict = f"ON CONFLICT ({conflict}) DO UPDATE SET {updates}"
+        else:
+            on_conflict = f"ON CONFLICT ({conflict}) DO NOTHING"
+
+        started = time.perf_counter()
+        with transaction.atomic(using=self.connection.alias), self.connection.cursor() as cursor:
+            temp_table = self._copy_to_temp_table(cursor, model, fields, objs)
+            cursor.execute(
+                f"INSERT INTO {quote(model._meta.db_table)} ({columns}) "
+                f"SELECT {columns} FROM {quote(temp_table)} {on_conflict}"
+            )
+            cursor.execute(f"DROP TABLE {quote(temp_table)}")
+        self._record(model.__name__, len(objs), started)
+        return len(objs)
+
+    def update(self, model, objs, fields):
+        objs = list(objs)
+        if not objs:
+            return 0
+        quote = self.connection.ops.quote_name
+        pk = model._meta.pk
+        copied = [pk, *self._columns(model, fields)]
+        updates = ", ".join(f"{quote(field.column)} = copied.{quote(field.column)}" for field in copied[1:])
+
+        started = time.perf_counter()
+        with transaction.atomic(using=self.connection.alias), self.connection.cursor() as cursor:
+            temp_table = self._copy_to_temp_table(cursor, model, copied, objs)
+            cursor.execute(
+                f"UPDATE {quote(model._meta.db_table)} SET {updates} FROM {quote(temp_table)} AS copied "
+                f"WHERE {quote(model._meta.db_table)}.{quote(pk.column)} = copied.{quote(pk.column)}"
+            )
+            cursor.execute(f"DROP TABLE {quote(temp_table)}")
+        self._record(model.__name__, len(objs), started)
+        return len(objs)
+
+    def replace_m2m(self, relation, links):
+        if not links:
+            return 0
+        through = relation.through
+        source_column = through._meta.get_field(relation.field.m2m_field_name()).column
+        target_column = through._meta.get_field(relation.field.m2m_reverse_field_name()).column
+        quote = self.connection.ops.quote_name
+        rows = [(source_id, target_id) for source_id, target_ids in links.items() for target_id in set(target_ids)]
+
+        started = time.perf_counter()
+        with transaction.atomic(using=self.connection.alias), self.connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {quote(through._meta.db_table)} WHERE {quote(source_column)} = ANY(%s)", [list(links)]
+            )
+            self._copy(cursor, through._meta.db_table, [source_column, target_column], rows)
+        self._record(through.__name__, len(rows), started)
+        return len(rows)
+
+
+def bulk_writer(batch_size=DEFAULT_BATCH_SIZE, connection=default_connection):
+    """
+    Return the BulkWriter suited to the database of `connection`: COPY on Postgres, bulk statements elsewhere.
+    """
+    if connection.vendor == "postgresql":
+        return PostgresCopyWriter(batch_size=batch_size, connection=connection)
+    return BulkWriter(batch_size=batch_size)
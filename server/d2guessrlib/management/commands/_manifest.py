@@ -0,0 +1,336 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from pathlib import Path
+
+import requests
+
+logger = logging.getLogger("populate_db")
+
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_TIMEOUT = 20
+DOWNLOAD_WORKERS = 4
+DOWNLOAD_RETRIES = 3
+DOWNLOAD_RETRY_DELAY = 2
+
+MANIFEST_CACHE_SIZE = 4096
+MANIFEST_MMAP_SIZE = 256 * 1024 * 1024
+MAX_OPEN_MANIFESTS = 4
+# Bound parameters per statement, under the lowest default limit of SQLite builds (999)
+SQLITE_MAX_VARIABLES = 900
+
+
+class DownloadCancelled(Exception):
+    """A download was stopped because another one failed."""
+
+
+def _atomic_write(dest_path, write):
+    """
+    Call `write(file)` on a temporary file next to `dest_path`, then rename it into place.
+
+    The destination is never left half written: on any error the temporary file is removed.
+    """
+    dest_dir = os.path.dirname(os.path.abspath(dest_path))
+    fd, temp_path = tempfile.mkstemp(dir=dest_dir, prefix=".", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as temp_file:
+            write(temp_file)
+        os.replace(temp_path, dest_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def download_file(
+    url, dest_path, session=None, timeout=DOWNLOAD_TIMEOUT, chunk_size=DOWNLOAD_CHUNK_SIZE, cancel_event=None
+):
+    """
+    Stream `url` to `dest_path`, holding at most `chunk_size` bytes in memory.
+
+    Progress is logged every 10% when the server sends a Content-Length. Setting `cancel_event`
+    stops the transfer at the next chunk with DownloadCancelled.
+    """
+    http = session or requests
+    name = os.path.basename(dest_path)
+
+    def write(temp_file):
+        with http.get(url, stream=True, timeout=timeout) as response:
+            response.raise_for_status()
+            total = int(response.headers.get("Content-Length") or 0)
+            received = 0
+            next_step = 10
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                if cancel_event is not None and cancel_event.is_set():
+                    raise DownloadCancelled(f"Download of {name} cancelled")
+                temp_file.write(chunk)
+                received += len(chunk)
+                if total and received * 100 >= next_step * total:
+                    logger.debug("%s: %d%% (%d/%d bytes)", name, received * 100 // total, received, total)
+                    next_step = received * 100 // total + 10
+
+    _atomic_write(dest_path, write)
+    return dest_path
+
+
+def extract_zip_member(zip_path, dest_path, chunk_size=DOWNLOAD_CHUNK_SIZE):
+    """
+    Inflate the first member of `zip_path` to `dest_path` in `chunk_size` pieces.
+    """
+    with zipfile.ZipFile(zip_path) as archive:
+        name = archive.namelist()[0]
+
+        def write(temp_file):
+            with archive.open(name) as member:
+                shutil.copyfileobj(member, temp_file, chunk_size)
+
+        _atomic_write(dest_path, write)
+    return dest_path
+
+
+def download_manifest_database(
+    url, dest_path, session=None, timeout=DOWNLOAD_TIMEOUT, chunk_size=DOWNLOAD_CHUNK_SIZE, cancel_event=None
+):
+    """
+    Download a zipped manifest database and extract it to `dest_path`.
+
+    Both the archive and the database are streamed through disk, so peak memory does not depend on
+    the size of the manifest.
+    """
+    zip_path = f"{dest_path}.zip"
+    logger.debug("Getting sqlite_db from %s", url)
+    try:
+        download_file(url, zip_path, session=session, timeout=timeout, chunk_size=chunk_size, cancel_event=cancel_event)
+        extract_zip_member(zip_path, dest_path, chunk_size=chunk_size)
+    finally:
+        if os.path.exists(zip_path):
+            os.remove(zip_path)
+    logger.debug("Extracted %s", dest_path)
+    return dest_path
+
+
+def file_checksum(path, chunk_size=DOWNLOAD_CHUNK_SIZE):
+    """
+    Return the sha256 hex digest of the file at `path`, read `chunk_size` bytes at a time.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _download_with_retry(url, dest_path, cancel_event, retries, retry_delay, **kwargs):
+    for attempt in range(1, retries + 1):
+        try:
+            return download_manifest_database(url, dest_path, cancel_event=cancel_event, **kwargs)
+        except (requests.RequestException, zipfile.BadZipFile) as e:
+            client_error = isinstance(e, requests.HTTPError) and e.response is not None and e.response.status_code < 500
+            if attempt == retries or client_error:
+                raise
+            logger.warning("Attempt %i/%i failed for %s: %r", attempt, retries, dest_path, e)
+            if cancel_event.wait(retry_delay * 2 ** (attempt - 1)):
+                raise DownloadCancelled(f"Download of {dest_path} cancelled")
+
+
+def download_manifest_databases(
+    urls,
+    dest_dir,
+    max_workers=DOWNLOAD_WORKERS,
+    retries=DOWNLOAD_RETRIES,
+    retry_delay=DOWNLOAD_RETRY_DELAY,
+    **kwargs,
+):
+    """
+    Download the manifest databases of every language concurrently.
+
+    `urls` maps a language code to its zipped database URL. Each database is written to
+    `dest_dir/world_sql_[lang_code].content` and retried up to `retries` times. The first failure
+    cancels the pending and running downloads and is raised once they have stopped.
+    Returns the database path of every language.
+    """
+    cancel_event = threading.Event()
+    paths = {}
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="manifest") as executor:
+        futures = {
+            executor.submit(
+                _download_with_retry,
+                url,
+                os.path.join(dest_dir, f"world_sql_{lang_code}.content"),
+                cancel_event,
+                retries,
+                retry_delay,
+                **kwargs,
+            ): lang_code
+            for lang_code, url in urls.items()
+        }
+        try:
+            for future in as_completed(futures):
+                paths[futures[future]] = future.result()
+                logger.info("Downloaded %s manifest (%i/%i)", futures[future].upper(), len(paths), len(futures))
+        except BaseException:
+            cancel_event.set()
+            for future in futures:
+                future.cancel()
+            raise
+    return paths
+
+
+def signed_hash(hash_id):
+    """
+    Convert an unsigned 32 bits Bungie hash to the signed integer used as `id` in manifest tables.
+    """
+    hash_id = int(hash_id)
+    return hash_id - 2**32 if hash_id >= 2**31 else hash_id
+
+
+def unsigned_hash(row_id):
+    """
+    Convert the signed `id` of a manifest table row back to its unsigned 32 bits Bungie hash.
+    """
+    return int(row_id) % 2**32
+
+
+class ManifestReader:
+    """
+    Read-only access to a manifest database that decodes definitions on demand.
+
+    Definitions are looked up through the integer primary key of each table and the last
+    `cache_size` decoded rows are kept in an LRU cache.
+    """
+
+    def __init__(self, connection, cache_size=MANIFEST_CACHE_SIZE):
+        self.connection = connection
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+
+    @classmethod
+    def open(cls, path, cache_size=MANIFEST_CACHE_SIZE):
+        """
+        Open a manifest file read-only. The file is flagged immutable so SQLite skips locking,
+        and is memory-mapped instead of being read through the page cache.
+        """
+        uri = f"{Path(path).resolve().as_uri()}?mode=ro&immutable=1"
+        connection = sqlite3.connect(uri, uri=True)
+        connection.execute(f"PRAGMA mmap_size = {MANIFEST_MMAP_SIZE}")
+        return cls(connection, cache_size=cache_size)
+
+    def cursor(self):
+        return self.connection.cursor()
+
+    def close(self):
+        self._cache.clear()
+        self.connection.close()
+
+    def get(self, table_name, hash_id):
+        """
+        Return the decoded definition of `hash_id` in `table_name`, or None if there is none.
+        """
+        key = (table_name, int(hash_id))
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        row = self.connection.execute(f"SELECT json FROM {table_name} WHERE id = ?", (signed_hash(hash_id),)).fetchone()
+        definition = json.loads(row[0]) if row else None
+
+        self._remember(key, definition)
+        return definition
+
+    def get_many(self, table_name, hashes):
+        """
+        Return the decoded definitions of `hashes` in `table_name` by hash, None for those there are none.
+
+        Definitions that are not cached are read in one query per `SQLITE_MAX_VARIABLES` hashes.
+        """
+        definitions = {}
+        missing = []
+        for hash_id in dict.fromkeys(int(hash_id) for hash_id in hashes):
+            key = (table_name, hash_id)
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                definitions[hash_id] = self._cache[key]
+            else:
+                missing.append(hash_id)
+
+        for start in range(0, len(missing), SQLITE_MAX_VARIABLES):
+            chunk = missing[start : start + SQLITE_MAX_VARIABLES]
+            rows = self.connection.execute(
+                f"SELECT id, json FROM {table_name} WHERE id IN ({', '.join('?' * len(chunk))})",
+                [signed_hash(hash_id) for hash_id in chunk],
+            ).fetchall()
+            found = {unsigned_hash(row_id): json.loads(row_json) for row_id, row_json in rows}
+            for hash_id in chunk:
+                definitions[hash_id] = found.get(hash_id)
+                self._remember((table_name, hash_id), definitions[hash_id])
+        return definitions
+
+    def _remember(self, key, definition):
+        self._cache[key] = definition
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+
+class ManifestSet:
+    """
+    The manifest databases of a run by language, opened on demand by the thread reading them.
+
+    At most `max_open` databases are open through the set at once, whatever the number of languages
+    imported. Each one is closed as soon as its reader is done with it. Readers opened outside of the
+    set, such as the English one populate_db keeps for the whole run, do not count towards `max_open`.
+    """
+
+    def __init__(self, paths, max_open=MAX_OPEN_MANIFESTS):
+        self.paths = dict(paths)
+        self.max_open = max_open
+        self._slots = threading.BoundedSemaphore(max_open)
+
+    @property
+    def localized_languages(self):
+        return sorted(lang_code for lang_code in self.paths if lang_code != "en")
+
+    @contextmanager
+    def open(self, lang_code):
+        """
+        Open the database of `lang_code` once one of the `max_open` slots is free.
+        Callers must not open a database while holding another one, or they could wait for each other.
+        """
+        with self._slots:
+            reader = ManifestReader.open(self.paths[lang_code])
+            try:
+                yield reader
+            finally:
+                reader.close()
+
+    @contextmanager
+    def cursor(self, lang_code):
+        """
+        Open the database of `lang_code` like `open`, and give a cursor on it.
+        """
+        with self.open(lang_code) as reader:
+            yield reader.cursor()
+
+    def map(self, func, lang_codes):
+        """
+        Call `func(lang_code, cursor)` for every language of `lang_codes` concurrently.
+        Returns the value returned for each language.
+        """
+
+        def call(lang_code):
+            with self.cursor(lang_code) as cursor:
+                return func(lang_code, cursor)
+
+        lang_codes = list(lang_codes)
+        if len(lang_codes) <= 1:
+            return {lang_code: call(lang_code) for lang_code in lang_codes}
+        with ThreadPoolExecutor(max_workers=self.max_open, thread_name_prefix="manifest") as executor:
+            return dict(zip(lang_codes, executor.map(call, lang_codes)))
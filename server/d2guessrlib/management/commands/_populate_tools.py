@@ -1,23 +1,35 @@
 import json
 import logging
 import sqlite3
+import time
+from contextlib import nullcontext
+from itertools import islice
 
 from django.contrib.contenttypes.models import ContentType
 
+from d2guessrauth.models import BungieAccount
+from d2guessrlib.management.commands._bulk import bulk_writer
+from d2guessrlib.management.commands._manifest import (
+    SQLITE_MAX_VARIABLES,
+    ManifestReader,
+    signed_hash,
+    unsigned_hash,
+)
 from d2guessrlib.management.commands._REFS import (
     CATEGORY_SLOT_HM,
     CLASS_HM,
     DAMAGE_TYPE_HM,
     STATS_HM,
     TIER_TYPE_HM,
-    classify_item,
 )
+from d2guessrlib.management.commands._transform import TRANSFORM_WORKERS, definition_fingerprint, transform_items
 from d2guessrlib.models import (
     Category,
     ClassType,
     ContentTranslation,
     DamageType,
     Item,
+    ItemHashAlias,
     ItemStat,
     ItemTranslation,
     Perk,
@@ -29,84 +41,244 @@ from d2guessrlib.models import (
 logger = logging.getLogger("populate_db")
 
 
+def load_table_rows(cursor, table_name, hashset=None, extra_query="", columns="id, json"):
+    """
+    Load the (id, undecoded json) rows of a sql table from cursor, or the `columns` selected instead.
+
+    Rows of `hashset` are looked up on the `id` primary key with bound parameters, in one query per
+    `SQLITE_MAX_VARIABLES` hashes. `extra_query` filters (and groups) the rows of each of these queries.
+    """
+    if hashset:
+        ids = [signed_hash(hash_id) for hash_id in dict.fromkeys(hashset)]
+        chunks = [ids[start : start + SQLITE_MAX_VARIABLES] for start in range(0, len(ids), SQLITE_MAX_VARIABLES)]
+    else:
+        chunks = [[]]
+
+    rows = []
+    for chunk in chunks:
+        query = f"SELECT {columns} FROM {table_name}"
+        filters = []
+        if chunk:
+            filters.append(f"id IN ({', '.join('?' * len(chunk))})")
+        if extra_query:
+            filters.append(extra_query)
+        if filters:
+            query += " WHERE " + " AND ".join(filters)
+        try:
+            cursor.execute(query, chunk)
+        except sqlite3.OperationalError as exc:
+            raise Exception(f"Error when processing query: {repr(exc)}, {hashset}")
+        rows.extend(cursor.fetchall())
+    return rows
+
+
 def load_table(cursor, table_name, hashset=None, extra_query=""):
     """
     Load sql table from cursor.
     """
-    query = "SELECT json FROM %s"
-    filters = []
-    if hashset and isinstance(hashset, tuple):
-        if len(hashset) > 1:
-            filters.append(f"json_extract(json, '$.hash') IN {hashset}")
-        else:
-            filters.append(f"json_extract(json, '$.hash') = {hashset[0]}")
-    if extra_query:
-        filters.append(extra_query)
-    if filters:
-        filter_query = " WHERE " + " AND ".join(filters)
-        query += filter_query
-    try:
-        cursor.execute(query % table_name)
-    except sqlite3.OperationalError as exc:
-        raise Exception(f"Error when processing query: {repr(exc)}, {hashset}")
-    rows = cursor.fetchall()
-    return (json.loads(r[0]) for r in rows)
-
-
-def create_or_update_object_translations(
-    target_object, content_type, localized_cursors, table_name, hashset=None, extra_query=""
-):
+    rows = load_table_rows(cursor, table_name, hashset=hashset, extra_query=extra_query)
+    return (json.loads(r[1]) for r in rows)
+
+
+def load_item_translations(cursor, hashset):
+    """
+    Return the localized (name, flavor text) of the items of `hashset` by row id.
+
+    Only these two fields are extracted by SQLite, so the definitions are neither sent to Python nor decoded.
+    """
+    rows = load_table_rows(
+        cursor,
+        "DestinyInventoryItemDefinition",
+        hashset=hashset,
+        columns="id, json_extract(json, '$.displayProperties.name'), json_extract(json, '$.flavorText')",
+    )
+    return {row_id: (name, flavor_text) for row_id, name, flavor_text in rows}
+
+
+def map_languages(func, lang_codes, localized_cursors=None, manifests=None):
+    """
+    Call `func(lang_code, cursor)` for every language of `lang_codes`. Returns the value of each language.
+
+    Languages are read concurrently from `manifests` (a ManifestSet) when given, one after the other
+    from `localized_cursors` otherwise.
+    """
+    if manifests is not None:
+        return manifests.map(func, lang_codes)
+    return {lang_code: func(lang_code, localized_cursors[lang_code]) for lang_code in lang_codes}
+
+
+class TranslationIndex:
+    """
+    Localized definitions keyed by hash, shared by all the create_or_update_* functions of a run.
+
+    Every (table, language) pair is only queried for the hashes it has not been asked for yet,
+    so each localized definition is decoded once per run. `seconds` is the time spent loading.
+    Definitions are read from `localized_cursors`, or from the databases of `manifests` (a ManifestSet),
+    which loads every language concurrently.
+    """
+
+    def __init__(self, localized_cursors=None, manifests=None):
+        self.localized_cursors = localized_cursors or {}
+        self.manifests = manifests
+        self.seconds = 0.0
+        self._rows = {}
+        self._requested = {}
+        self._fully_loaded = set()
+
+    @property
+    def languages(self):
+        if self.manifests is not None:
+            return self.manifests.localized_languages
+        return list(self.localized_cursors)
+
+    def load(self, table_name, hashset=None):
+        """
+        Index the definitions of `hashset` for every language, or the whole table if `hashset` is None.
+        """
+        started = time.perf_counter()
+        missing_by_language = {}
+        for lang_code in self.languages:
+            key = (table_name, lang_code)
+            if key in self._fully_loaded:
+                continue
+            requested = self._requested.setdefault(key, set())
+
+            if hashset is None:
+                missing_by_language[lang_code] = None
+                self._fully_loaded.add(key)
+            else:
+                missing = tuple(hash_id for hash_id in set(hashset) if hash_id not in requested)
+                if not missing:
+                    continue
+                requested.update(missing)
+                missing_by_language[lang_code] = missing
+
+        loaded = map_languages(
+            lambda lang_code, cursor: list(load_table(cursor, table_name, hashset=missing_by_language[lang_code])),
+            missing_by_language,
+            localized_cursors=self.localized_cursors,
+            manifests=self.manifests,
+        )
+        for lang_code, definitions in loaded.items():
+            rows = self._rows.setdefault((table_name, lang_code), {})
+            for row in definitions:
+                rows[row["hash"]] = row
+            logger.debug("Indexed %s %s definitions for %s", len(rows), lang_code.upper(), table_name)
+        self.seconds += time.perf_counter() - started
+
+    def get(self, table_name, lang_code, hash_id):
+        return self._rows.get((table_name, lang_code), {}).get(hash_id, {})
+
+
+def create_or_update_object_translations(target_objects, content_type, translation_index, table_name, writer):
     """
-    Create or update translations for a given object in multiple languages.
+    Create or update translations for the given objects in every indexed language.
     """
-    if hashset is None:
-        hashset = []
+    target_objects = list(target_objects)
+    translation_index.load(table_name, hashset=tuple(obj.id_bungie for obj in target_objects))
 
     model_name = content_type.name
-    for lang_code, cursor in localized_cursors.items():
-        translations_by_hash = {
-            row["hash"]: row
-            for row in load_table(cursor, table_name=table_name, hashset=hashset, extra_query=extra_query)
-        }
-
-        display_props = translations_by_hash.get(target_object.id_bungie, {}).get("displayProperties", {})
-        translated_fields = {"name": display_props.get("name")}
-
-        description = display_props.get("description")
-        if description:
-            translated_fields["desc"] = description
-
-        for field_name, translated_text in translated_fields.items():
-            ContentTranslation.objects.update_or_create(
-                language=lang_code,
-                field_name=field_name,
-                content_type=content_type,
-                object_id=target_object.id,
-                text=translated_text,
-            )
-            logger.info(
-                f"Created {lang_code.upper()} - ContentTranslation({field_name}) for {model_name}"
-                f"({translated_fields['name']})"
+    translations = []
+    for lang_code in translation_index.languages:
+        for target_object in target_objects:
+            display_props = translation_index.get(table_name, lang_code, target_object.id_bungie).get(
+                "displayProperties", {}
             )
+            name = display_props.get("name")
+            if not name:
+                logger.critical(
+                    "Name not found for %s translation of %s(%s). Skipping",
+                    lang_code.upper(),
+                    model_name,
+                    target_object.id_bungie,
+                )
+                continue
+            translated_fields = {"name": name}
+
+            description = display_props.get("description")
+            if description:
+                translated_fields["desc"] = description
+
+            for field_name, translated_text in translated_fields.items():
+                translations.append(
+                    ContentTranslation(
+                        language=lang_code,
+                        field_name=field_name,
+                        content_type=content_type,
+                        object_id=target_object.id,
+                        text=translated_text,
+                    )
+                )
+                logger.info(f"Created {lang_code.upper()} - ContentTranslation({field_name}) for {model_name}({name})")
+
+    writer.upsert(
+        ContentTranslation,
+        translations,
+        unique_fields=["language", "field_name", "content_type", "object_id"],
+        update_fields=["text"],
+    )
 
 
-def create_or_update_damage_types(english_cursor, localized_cursors=None):
+class IngestionContext:
     """
-    Create or update all DamageType objects from English definitions and their translations.
+    Lookup objects of a run preloaded as `id_bungie -> instance` maps.
+
+    Foreign keys to these models are resolved from memory instead of one SELECT per item.
     """
-    if localized_cursors is None:
-        localized_cursors = {}
 
+    LOOKUP_MODELS = (DamageType, ClassType, Category, TierType, StatType)
+
+    def __init__(self):
+        self._instances = {}
+
+    @classmethod
+    def preload(cls, models=LOOKUP_MODELS):
+        context = cls()
+        for model in models:
+            context._instances[model] = model.objects.in_bulk(field_name="id_bungie")
+            logger.debug("Preloaded %i %s", len(context._instances[model]), model.__name__)
+        return context
+
+    def get(self, model, id_bungie):
+        """
+        Return the instance of `model` with this `id_bungie`, raising `model.DoesNotExist` if there is none.
+        """
+        instance = self._instances[model].get(int(id_bungie)) if id_bungie is not None else None
+        if instance is None:
+            raise model.DoesNotExist(f"{model.__name__} matching id_bungie={id_bungie} does not exist.")
+        return instance
+
+    def filter(self, model, id_bungie_list):
+        instances = self._instances[model]
+        return [instances[int(id_bungie)] for id_bungie in id_bungie_list if int(id_bungie) in instances]
+
+
+def upsert_lookup_objects(model, objs, update_fields, writer):
+    """
+    Bulk upsert lookup objects on their `id_bungie`.
+
+    Returns the created and updated counts along with the saved instances keyed by `id_bungie`.
+    """
+    hashes = [obj.id_bungie for obj in objs]
+    existing = set(model.objects.filter(id_bungie__in=hashes).values_list("id_bungie", flat=True))
+    writer.upsert(model, objs, unique_fields=["id_bungie"], update_fields=update_fields)
+
+    instances = model.objects.in_bulk(hashes, field_name="id_bungie")
+    created_count = len(set(hashes) - existing)
+    return created_count, len(existing), instances
+
+
+def build_damage_types(english_cursor):
+    """
+    Build the DamageType objects of the English definitions, without saving them.
+    """
     english_damage_defs = {
         entry["hash"]: entry
         for entry in load_table(english_cursor, "DestinyDamageTypeDefinition", hashset=DAMAGE_TYPE_HM.get_values())
     }
     logger.debug(f"Got {len(english_damage_defs)} for DamageType (EN)")
 
-    created_count = 0
-    updated_count = 0
-    content_type = ContentType.objects.get_for_model(DamageType)
-
+    damage_type_objs = []
     for hash_id, definition in english_damage_defs.items():
         display_props = definition.get("displayProperties", {})
         icon_url = display_props.get("icon")
@@ -115,186 +287,197 @@ def create_or_update_damage_types(english_cursor, localized_cursors=None):
         if not (icon_url and name):
             continue
 
-        damage_type_obj, was_created = DamageType.objects.update_or_create(
-            id_bungie=hash_id, defaults={"icon_url": icon_url, "name": name}
-        )
-
+        damage_type_objs.append(DamageType(id_bungie=hash_id, icon_url=icon_url, name=name))
         logger.info(f"Created EN - DamageType({name})")
-        created_count += int(was_created)
-        updated_count += int(not was_created)
+    return damage_type_objs
 
-        create_or_update_object_translations(
-            target_object=damage_type_obj,
-            content_type=content_type,
-            localized_cursors=localized_cursors,
-            table_name="DestinyDamageTypeDefinition",
-            hashset=DAMAGE_TYPE_HM.get_values(),
-        )
 
-    return created_count, updated_count
-
-
-def create_or_update_tier_types(english_cursor, localized_cursors=None):
+def build_tier_types(english_cursor):
     """
-    Create or update all TierType objects from English definitions and their translations.
+    Build the TierType objects of the English definitions, without saving them.
     """
-    if localized_cursors is None:
-        localized_cursors = {}
-
     tier_definitions = {
         row["hash"]: row
         for row in load_table(english_cursor, "DestinyItemTierTypeDefinition", hashset=TIER_TYPE_HM.get_values())
     }
     logger.debug(f"Got {len(tier_definitions)} for DestinyItemTierTypeDefinition")
 
-    created_count = 0
-    updated_count = 0
-    content_type = ContentType.objects.get_for_model(TierType)
-
+    tier_type_objs = []
     for hash_id, definition in tier_definitions.items():
         name = definition.get("displayProperties", {}).get("name")
-        tier_type_obj, created = TierType.objects.update_or_create(id_bungie=hash_id, defaults={"name": name})
-        created_count += int(created)
-        updated_count += int(not created)
+        tier_type_objs.append(TierType(id_bungie=hash_id, name=name))
         logger.info(f"Created EN - TierType({name})")
-
-        create_or_update_object_translations(
-            target_object=tier_type_obj,
-            content_type=content_type,
-            localized_cursors=localized_cursors,
-            table_name="DestinyItemTierTypeDefinition",
-            hashset=TIER_TYPE_HM.get_values(),
-        )
-
-    return created_count, updated_count
+    return tier_type_objs
 
 
-def create_or_update_categories(english_cursor, localized_cursors=None):
+def build_categories(english_cursor):
     """
-    Create or update all Category objects from English definitions and their translations.
+    Build the Category objects of the English definitions, without saving them.
     """
-    if localized_cursors is None:
-        localized_cursors = {}
-
     category_definitions = {
         row["hash"]: row
         for row in load_table(english_cursor, "DestinyItemCategoryDefinition", hashset=CATEGORY_SLOT_HM.get_values())
     }
     logger.debug(f"Got {len(category_definitions)} for DestinyItemCategoryDefinition")
 
-    created_count = 0
-    updated_count = 0
-    content_type = ContentType.objects.get_for_model(Category)
-
+    category_objs = []
     for hash_id, definition in category_definitions.items():
         name = definition.get("displayProperties", {}).get("name")
-        category_obj, created = Category.objects.update_or_create(
-            id_bungie=hash_id, defaults={"name": name, "icon_url": None}
-        )
-        created_count += int(created)
-        updated_count += int(not created)
+        category_objs.append(Category(id_bungie=hash_id, name=name, icon_url=None))
         logger.info(f"Created EN - Category({name})")
-
-        create_or_update_object_translations(
-            target_object=category_obj,
-            content_type=content_type,
-            localized_cursors=localized_cursors,
-            table_name="DestinyItemCategoryDefinition",
-            hashset=CATEGORY_SLOT_HM.get_values(),
-        )
-
-    return created_count, updated_count
+    return category_objs
 
 
-def create_or_update_classes(english_cursor, localized_cursors=None):
+def build_classes(english_cursor):
     """
-    Create or update all ClassType objects from English definitions and their translations.
+    Build the ClassType objects of the English definitions, without saving them.
     """
-    if localized_cursors is None:
-        localized_cursors = {}
-
     class_definitions = {
         row["hash"]: row
         for row in load_table(english_cursor, "DestinyItemCategoryDefinition", hashset=CLASS_HM.get_values())
     }
     logger.debug(f"Got {len(class_definitions)} for DestinyItemCategoryDefinition (Classes)")
 
-    created_count = 0
-    updated_count = 0
-    content_type = ContentType.objects.get_for_model(ClassType)
-
+    class_objs = []
     for hash_id, definition in class_definitions.items():
         name = definition.get("displayProperties", {}).get("name")
-        class_obj, created = ClassType.objects.update_or_create(id_bungie=hash_id, defaults={"name": name})
-        created_count += int(created)
-        updated_count += int(not created)
+        class_objs.append(ClassType(id_bungie=hash_id, name=name))
         logger.info(f"Created EN - ClassType({name})")
+    return class_objs
 
-        create_or_update_object_translations(
-            target_object=class_obj,
-            content_type=content_type,
-            localized_cursors=localized_cursors,
-            table_name="DestinyItemCategoryDefinition",
-            hashset=CLASS_HM.get_values(),
-        )
-
-    return created_count, updated_count
 
-
-def create_or_update_stat_types(english_cursor, localized_cursors=None):
+def build_stat_types(english_cursor):
     """
-    Create or update all StatType objects from English definitions and their translations.
+    Build the StatType objects of the English definitions, without saving them.
     """
-    if localized_cursors is None:
-        localized_cursors = {}
-
     stat_definitions = {
         row["hash"]: row for row in load_table(english_cursor, "DestinyStatDefinition", hashset=STATS_HM.get_values())
     }
     logger.debug(f"Got {len(stat_definitions)} for DestinyStatDefinition")
 
-    created_count = 0
-    updated_count = 0
-    content_type = ContentType.objects.get_for_model(StatType)
-
+    stat_objs = []
     for hash_id, definition in stat_definitions.items():
         display = definition.get("displayProperties", {})
         name = display.get("name")
         icon_url = display.get("icon")
         description = display.get("description")
 
-        stat_obj, created = StatType.objects.update_or_create(
-            id_bungie=hash_id, defaults={"name": name, "icon_url": icon_url, "desc": description}
-        )
-        created_count += int(created)
-        updated_count += int(not created)
+        stat_objs.append(StatType(id_bungie=hash_id, name=name, icon_url=icon_url, desc=description))
         logger.info(f"Created EN - StatType({name})")
+    return stat_objs
+
+
+class Lookup:
+    """
+    How the objects of a lookup model are read from the manifest and saved.
+    """
+
+    def __init__(self, model, table_name, update_fields, build):
+        self.model = model
+        self.table_name = table_name
+        self.update_fields = update_fields
+        self.build = build
+
+    def prepare(self, open_english, translation_index):
+        """
+        Build the objects of the manifest and index their translations. Only reads the manifest.
+
+        `open_english()` returns a context manager giving a cursor on the English database. It is left
+        before the translations are loaded, so readers sharing a ManifestSet never hold two databases.
+        """
+        with open_english() as english_cursor:
+            objs = self.build(english_cursor)
+        translation_index.load(self.table_name, hashset=tuple(obj.id_bungie for obj in objs))
+        return objs
+
+    def write(self, objs, writer, translation_index):
+        """
+        Upsert `objs` and their translations. Returns the created and updated counts.
+        """
+        created_count, updated_count, instances = upsert_lookup_objects(
+            self.model, objs, update_fields=self.update_fields, writer=writer
+        )
+        self.write_translations(instances.values(), writer, translation_index)
+        return created_count, updated_count
 
+    def write_translations(self, instances, writer, translation_index):
         create_or_update_object_translations(
-            target_object=stat_obj,
-            content_type=content_type,
-            localized_cursors=localized_cursors,
-            table_name="DestinyStatDefinition",
-            hashset=STATS_HM.get_values(),
+            target_objects=instances,
+            content_type=ContentType.objects.get_for_model(self.model),
+            translation_index=translation_index,
+            table_name=self.table_name,
+            writer=writer,
         )
 
-    return created_count, updated_count
+    def create_or_update(self, english_cursor, localized_cursors=None, writer=None, translation_index=None):
+        if writer is None:
+            writer = bulk_writer()
+        if translation_index is None:
+            translation_index = TranslationIndex(localized_cursors or {})
+        objs = self.prepare(lambda: nullcontext(english_cursor), translation_index)
+        return self.write(objs, writer, translation_index)
+
+
+# Lookups imported before the items, by stage name. None of them depends on another.
+LOOKUPS = {
+    "damage_types": Lookup(DamageType, "DestinyDamageTypeDefinition", ["icon_url", "name"], build_damage_types),
+    "tier_types": Lookup(TierType, "DestinyItemTierTypeDefinition", ["name"], build_tier_types),
+    "categories": Lookup(Category, "DestinyItemCategoryDefinition", ["name", "icon_url"], build_categories),
+    "classes": Lookup(ClassType, "DestinyItemCategoryDefinition", ["name"], build_classes),
+    "stat_types": Lookup(StatType, "DestinyStatDefinition", ["name", "icon_url", "desc"], build_stat_types),
+}
 
 
-def create_or_update_seasons(english_cursor, localized_cursors=None):
+def create_or_update_damage_types(english_cursor, localized_cursors=None, writer=None, translation_index=None):
+    """
+    Create or update all DamageType objects from English definitions and their translations.
+    """
+    return LOOKUPS["damage_types"].create_or_update(english_cursor, localized_cursors, writer, translation_index)
+
+
+def create_or_update_tier_types(english_cursor, localized_cursors=None, writer=None, translation_index=None):
+    """
+    Create or update all TierType objects from English definitions and their translations.
+    """
+    return LOOKUPS["tier_types"].create_or_update(english_cursor, localized_cursors, writer, translation_index)
+
+
+def create_or_update_categories(english_cursor, localized_cursors=None, writer=None, translation_index=None):
+    """
+    Create or update all Category objects from English definitions and their translations.
+    """
+    return LOOKUPS["categories"].create_or_update(english_cursor, localized_cursors, writer, translation_index)
+
+
+def create_or_update_classes(english_cursor, localized_cursors=None, writer=None, translation_index=None):
+    """
+    Create or update all ClassType objects from English definitions and their translations.
+    """
+    return LOOKUPS["classes"].create_or_update(english_cursor, localized_cursors, writer, translation_index)
+
+
+def create_or_update_stat_types(english_cursor, localized_cursors=None, writer=None, translation_index=None):
+    """
+    Create or update all StatType objects from English definitions and their translations.
+    """
+    return LOOKUPS["stat_types"].create_or_update(english_cursor, localized_cursors, writer, translation_index)
+
+
+def create_or_update_seasons(english_cursor, localized_cursors=None, writer=None, translation_index=None):
     """
     Create or update all Season objects from English definitions and their translations.
     """
     if localized_cursors is None:
         localized_cursors = {}
+    if writer is None:
+        writer = bulk_writer()
+    if translation_index is None:
+        translation_index = TranslationIndex(localized_cursors)
 
     season_definitions = {row["hash"]: row for row in load_table(english_cursor, "DestinySeasonDefinition")}
     logger.debug(f"Got {len(season_definitions)} for DestinySeasonDefinition")
 
-    created_count = 0
-    updated_count = 0
-    content_type = ContentType.objects.get_for_model(Season)
-
+    season_objs = []
     for hash_id, definition in season_definitions.items():
         display = definition.get("displayProperties", {})
         name = display.get("name")
@@ -302,188 +485,276 @@ def create_or_update_seasons(english_cursor, localized_cursors=None):
         description = display.get("description")
         season_number = definition.get("seasonNumber")
 
-        season_obj, created = Season.objects.update_or_create(
-            id_bungie=hash_id,
-            defaults={"name": name, "icon_url": icon_url, "desc": description, "season_number": season_number},
+        season_objs.append(
+            Season(id_bungie=hash_id, name=name, icon_url=icon_url, desc=description, season_number=season_number)
         )
-        created_count += int(created)
-        updated_count += int(not created)
         logger.info(f"Created EN - Season({name})")
 
-        create_or_update_object_translations(
-            target_object=season_obj,
-            content_type=content_type,
-            localized_cursors=localized_cursors,
-            table_name="DestinySeasonDefinition",
-        )
+    created_count, updated_count, seasons = upsert_lookup_objects(
+        Season, season_objs, update_fields=["name", "icon_url", "desc", "season_number"], writer=writer
+    )
+
+    content_type = ContentType.objects.get_for_model(Season)
+    create_or_update_object_translations(
+        target_objects=seasons.values(),
+        content_type=content_type,
+        translation_index=translation_index,
+        table_name="DestinySeasonDefinition",
+        writer=writer,
+    )
 
     return created_count, updated_count
 
 
-def populate_item_stats(item, i_def_stats):
+def populate_item_stats(item, stats, context):
     """
-    Populate the stats for a given Item instance.
+    Build the stats for a given Item instance.
 
-    For each stat in i_def_stats that matches a tracked StatType,
-    this function creates or updates the corresponding ItemStat in the database.
+    `stats` maps the hash of each tracked StatType of the item to its value. This function
+    returns unsaved ItemStat objects to be bulk written by the caller.
     """
-    for stat_hash, _dict in i_def_stats.items():
-        if int(stat_hash) not in STATS_HM.get_values():
-            continue
-        stat_value = _dict.get("value")
-        stat_type_obj = StatType.objects.get(id_bungie=stat_hash)
-        try:
-            ItemStat.objects.update_or_create(item=item, value=stat_value, stat_type=stat_type_obj)
-        except:
-            raise
+    item_stats = []
+    for stat_hash, stat_value in stats.items():
+        stat_type_obj = context.get(StatType, stat_hash)
+        item_stats.append(ItemStat(item=item, value=stat_value, stat_type=stat_type_obj))
         logger.info(f"Created Stat({stat_type_obj}) for Item({item.api_name})")
+    return item_stats
 
 
-def create_or_update_items(english_cursor, localized_cursors=None, exotic_only=False):
-    """
-    Create or update Item objects and their related data (e.g. stats, perks, translations).
+ITEMS_FILTER_EXOTIC_ONLY = """
+    json_extract(json, '$.itemType') IN (2, 3)
+    AND json_extract(json, '$.inventory.tierType') = 6
+"""
 
-    This function:
-    - Filters and loads relevant items from DestinyInventoryItemDefinition.
-    - Classifies items by type, class, category, etc.
-    - Associates default damage types, perks, and stats.
-    - Creates or updates ItemTranslation records for localized data.
-    """
-    EXTRA_QUERY_EXOTIC_ONLY = """
-        json_extract(json, '$.itemType') IN (2, 3)
-        AND json_extract(json, '$.inventory.tierType') = 6
-        GROUP BY json_extract(json, '$.displayProperties.name')
+ITEMS_FILTER_ALL_ITEMS = """
+    json_extract(json, '$.itemType') IN (2, 3)
+    AND json_extract(json, '$.inventory.tierType') > 1
+"""
+
+# A single definition is imported per item name, the others are its aliases
+ITEMS_GROUP_BY_NAME = """
+    GROUP BY json_extract(json, '$.displayProperties.name')
+"""
+
+ITEMS_EXTRA_QUERY_EXOTIC_ONLY = ITEMS_FILTER_EXOTIC_ONLY + ITEMS_GROUP_BY_NAME
+
+ITEMS_EXTRA_QUERY_ALL_ITEMS = ITEMS_FILTER_ALL_ITEMS + ITEMS_GROUP_BY_NAME
+
+
+def load_item_variants(cursor, exotic_only=False):
     """
+    Return the hashes of every item definition that may be imported, by item name.
 
-    EXTRA_QUERY_ALL_ITEMS = """
-        json_extract(json, '$.itemType') IN (2, 3)
-        AND json_extract(json, '$.inventory.tierType') > 1
-        GROUP BY json_extract(json, '$.displayProperties.name')
+    All the definitions of a name (reissues, variants) are listed, including the one imported as its Item.
     """
+    rows = load_table_rows(
+        cursor,
+        "DestinyInventoryItemDefinition",
+        extra_query=ITEMS_FILTER_EXOTIC_ONLY if exotic_only else ITEMS_FILTER_ALL_ITEMS,
+        columns="id, json_extract(json, '$.displayProperties.name')",
+    )
+    variants = {}
+    for row_id, name in rows:
+        variants.setdefault(name, []).append(unsigned_hash(row_id))
+    return variants
+
+
+# Number of item records whose plugs are read together
+PLUG_PREPASS_SIZE = 1000
 
-    extra_query = EXTRA_QUERY_EXOTIC_ONLY if exotic_only else EXTRA_QUERY_ALL_ITEMS
 
+def iter_chunks(iterable, size):
+    """
+    Yield the items of `iterable` in lists of `size` items, the last one possibly shorter.
+    """
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def iter_item_records(
+    english_cursor,
+    localized_cursors=None,
+    exotic_only=False,
+    manifest_reader=None,
+    workers=TRANSFORM_WORKERS,
+    skip_hashes=(),
+    manifests=None,
+):
+    """
+    Read the item definitions to import and shape them into plain records, without touching the database.
+
+    Definitions are decoded and shaped into records by `workers` processes (see `transform_items`).
+    Their translations are read from `localized_cursors`, or from `manifests` (see `map_languages`).
+    Plug definitions are read through `manifest_reader` (built on the English cursor's connection if
+    not given) for `PLUG_PREPASS_SIZE` records at once, to keep the intrinsic perks of each item.
+    Items of `skip_hashes` are not read at all.
+    Each record lists in `alias_hashes` the hashes of all the definitions sharing its name (see
+    `load_item_variants`). Yields each item record with its intrinsic plug definitions keyed by hash.
+    """
+    extra_query = ITEMS_EXTRA_QUERY_EXOTIC_ONLY if exotic_only else ITEMS_EXTRA_QUERY_ALL_ITEMS
     if not localized_cursors:
         localized_cursors = {}
+    if manifest_reader is None:
+        manifest_reader = ManifestReader(english_cursor.connection)
 
-    full_table = {row["hash"]: row for row in load_table(english_cursor, "DestinyInventoryItemDefinition")}
-
-    item_defs_en = {
-        row["hash"]: row
-        for row in load_table(english_cursor, "DestinyInventoryItemDefinition", extra_query=extra_query)
-    }
-    logger.debug(f"Got {len(item_defs_en)} items")
+    item_rows = [
+        (row_id, item_json)
+        for row_id, item_json in load_table_rows(
+            english_cursor, "DestinyInventoryItemDefinition", extra_query=extra_query
+        )
+        if unsigned_hash(row_id) not in skip_hashes
+    ]
+    logger.debug(f"Got {len(item_rows)} items")
+    variants = load_item_variants(english_cursor, exotic_only=exotic_only) if item_rows else {}
+
+    # Localized name and flavor text of every item, fetched in one pass per language
+    languages = manifests.localized_languages if manifests is not None else sorted(localized_cursors)
+    item_hashes = tuple(unsigned_hash(row_id) for row_id, _ in item_rows)
+    localized_rows = (
+        map_languages(
+            lambda lang_code, cursor: load_item_translations(cursor, item_hashes),
+            languages,
+            localized_cursors=localized_cursors,
+            manifests=manifests,
+        )
+        if item_hashes
+        else {lang_code: {} for lang_code in languages}
+    )
+
+    # JSON decoding and shaping are done by the transform workers
+    records = transform_items(
+        (
+            (item_json, [localized_rows[lang_code].get(row_id) for lang_code in languages])
+            for row_id, item_json in item_rows
+        ),
+        workers=workers,
+    )
+    for chunk in iter_chunks(records, PLUG_PREPASS_SIZE):
+        # Plugs of the whole chunk are read at once, those shared by many items (e.g. frames) only once
+        plug_defs_by_hash = manifest_reader.get_many(
+            "DestinyInventoryItemDefinition", (plug_hash for record in chunk for plug_hash in record["plug_hashes"])
+        )
+        for record in chunk:
+            record["translations"] = dict(zip(languages, record["translations"]))
+            record["alias_hashes"] = variants.get(record["api_name"], [record["hash"]])
+
+            # Process sockets to find intrinsic Perks
+            plug_defs = {}
+            record["perk_hashes"] = []
+            for plug_hash in record.pop("plug_hashes"):
+                p_def = plug_defs_by_hash[plug_hash]
+                if not p_def:
+                    logger.critical(f"Did not find Plug definition for hash {plug_hash} Item({record['api_name']})")
+                    continue
+                if p_def.get("itemTypeDisplayName", "").lower() == "intrinsic":
+                    plug_defs[plug_hash] = p_def
+                    record["perk_hashes"].append(plug_hash)
+            yield record, plug_defs
+
+
+def build_item_records(
+    english_cursor, localized_cursors=None, exotic_only=False, manifest_reader=None, workers=TRANSFORM_WORKERS
+):
+    """
+    Return the records of `iter_item_records` and all their intrinsic plug definitions keyed by hash.
+    """
+    item_records = []
+    plug_defs = {}
+    for record, record_plug_defs in iter_item_records(
+        english_cursor,
+        localized_cursors=localized_cursors,
+        exotic_only=exotic_only,
+        manifest_reader=manifest_reader,
+        workers=workers,
+    ):
+        item_records.append(record)
+        plug_defs.update(record_plug_defs)
+    return item_records, plug_defs
+
+
+def write_items(
+    item_records, plug_defs, exotic_only=False, writer=None, translation_index=None, context=None, force=False
+):
+    """
+    Create or update Item objects and their related data (e.g. stats, perks, translations) from the
+    records of `build_item_records`.
 
-    created_count = 0
-    updated_count = 0
+    This function:
+    - Associates default damage types, perks, and stats.
+    - Creates or updates ItemTranslation records for localized data.
+    - Maps the hash of every variant of each item to it (ItemHashAlias).
+    - Deletes the items that are no longer in the manifest (full imports only).
 
-    for hash_id, item_def in item_defs_en.items():
-        # Parse key properties for the Item
-        try:
-            item = Item.objects.get(id_bungie=hash_id)
-            logger.debug("Found %s(%s)", item, hash_id)
-            item.translations.first().name
+    Items and perks store a fingerprint of their English and localized definitions. Only the
+    definitions whose fingerprint changed are written again, unless `force` is set.
 
+    Rows are collected in memory while walking the records and bulk written per model once the
+    loop is done, items first so that stats, translations and M2M rows can reference their pk.
+    New rows are inserted without fingerprint and fingerprints are written last, so the definitions
+    of an interrupted import, even outside of a transaction, are written again by the next run.
+    Lookup foreign keys are resolved through `context`, perk translations through `translation_index`.
+    """
+    if writer is None:
+        writer = bulk_writer()
+    if translation_index is None:
+        translation_index = TranslationIndex({})
+    if context is None:
+        context = IngestionContext.preload()
+
+    # Staged records come back from JSON with string keys
+    plug_defs = {int(plug_hash): p_def for plug_hash, p_def in plug_defs.items()}
+    existing_fingerprints = dict(Item.objects.filter(is_active=True).values_list("id_bungie", "fingerprint"))
+    existing_api_names = set(Item.objects.values_list("api_name", flat=True))
+
+    item_objs = []
+    perk_hashes_by_item = {}
+    damage_type_ids_by_item = {}
+    stats_by_item = {}
+    translations_by_item = {}
+    fingerprints_by_item = {}
+    unchanged_count = 0
+
+    for record in item_records:
+        hash_id = record["hash"]
+        api_name = record["api_name"]
+        if not force and existing_fingerprints.get(hash_id) == record["fingerprint"]:
+            unchanged_count += 1
             continue
-        except Item.DoesNotExist:
-            pass
-        except Exception as e:
-            logger.critical("exception %s : %r", item, e)
-
-        display = item_def.get("displayProperties", {})
-        api_name = display.get("name")
-        icon_url = display.get("icon")
-        screenshot_url = item_def.get("screenshot")
-        flavor_text = item_def.get("flavorText")
-        default_damage_type_hash = item_def.get("defaultDamageTypeHash")
-        item_category_hashes = item_def.get("itemCategoryHashes")
-        class_type_value = item_def.get("classType")
-        # season_hash = item_def.get("seasonHash")
 
         default_damage_type_obj = None
-        damage_types_obj_list = None
-        ammo_type_hash = None
-
-        if default_damage_type_hash:
-            default_damage_type_obj = DamageType.objects.get(id_bungie=default_damage_type_hash)
+        if record["default_damage_type_hash"]:
+            default_damage_type_obj = context.get(DamageType, record["default_damage_type_hash"])
             logger.debug(f"Found default DamageType({default_damage_type_obj}) for {api_name}")
-            damage_type_hashes = item_def.get("damageTypeHashes")
-            damage_types_obj_list = DamageType.objects.filter(id_bungie__in=damage_type_hashes)
-            ammo_type_hash = item_def.get("equippingBlock", {}).get("ammoType")
-
-        # Classify item using helper function
-        classification_info = classify_item(item_category_hashes=item_category_hashes, class_type=class_type_value)
-
-        class_obj = (
-            ClassType.objects.get(id_bungie=classification_info["classHash"])
-            if classification_info["classHash"]
-            else None
-        )
-        category_obj = Category.objects.get(id_bungie=classification_info["categoryHash"])
-        tier_type_obj = TierType.objects.get(id_bungie=item_def["inventory"]["tierTypeHash"])
+        damage_type_ids_by_item[hash_id] = [
+            damage_type.pk for damage_type in context.filter(DamageType, record["damage_type_hashes"])
+        ]
 
-        stat_group_hash = item_def.get("stats", {}).get("statGroupHash")
+        class_obj = context.get(ClassType, record["class_hash"]) if record["class_hash"] else None
+        category_obj = context.get(Category, record["category_hash"])
+        tier_type_obj = context.get(TierType, record["tier_type_hash"])
         # season_obj = Season.objects.get(id_bungie=season_hash)
 
-        perk_obj = None
-        added_perks = []
-        # Process sockets to find and create intrinsic Perks
-        for socket_entry in item_def.get("sockets", {}).get("socketEntries", []):
-            plug_hash = socket_entry.get("singleInitialItemHash")
-            if not plug_hash:
-                continue
-            p_def = full_table.get(plug_hash)
-            if not p_def:
-                logger.critical(f"Did not find Plug definition for hash {plug_hash} Item({api_name})")
-                continue
-            if p_def.get("itemTypeDisplayName", "").lower() == "intrinsic":
-                perk_obj, _ = Perk.objects.update_or_create(
-                    id_bungie=plug_hash,
-                    defaults={
-                        "name": p_def["displayProperties"]["name"],
-                        "desc": p_def["displayProperties"]["description"],
-                        "icon_url": p_def["displayProperties"].get("icon"),
-                        "is_intrinsic": True,
-                    },
-                )
-                added_perks.append(perk_obj)
-                logger.info(f"Created EN - Perk({perk_obj.name}) for Item({api_name})")
-                content_type = ContentType.objects.get_for_model(Perk)
-                create_or_update_object_translations(
-                    target_object=perk_obj,
-                    content_type=content_type,
-                    localized_cursors=localized_cursors,
-                    table_name="DestinyInventoryItemDefinition",
-                    hashset=(plug_hash,),
-                )
+        perk_hashes_by_item[hash_id] = record["perk_hashes"]
+        fingerprints_by_item[hash_id] = record["fingerprint"]
 
-        item_obj, created = Item.objects.update_or_create(
+        item_obj = Item(
             id_bungie=hash_id,
-            defaults={
-                "api_name": api_name,
-                "item_type": classification_info["itemTypeHash"],
-                "tier_type": tier_type_obj,
-                "class_type": class_obj,
-                "category": category_obj,
-                "icon_url": icon_url,
-                "screenshot_url": screenshot_url,
-                "default_damage_type": default_damage_type_obj,
-                "flavor_text": flavor_text,
-                "weapon_slot": classification_info["weaponSlotHash"],
-                "weapon_ammo_type": ammo_type_hash,
-                "stat_group_hash": stat_group_hash,
-                # "season": season_obj,
-            },
+            api_name=api_name,
+            item_type=record["item_type"],
+            tier_type=tier_type_obj,
+            class_type=class_obj,
+            category=category_obj,
+            icon_url=record["icon_url"],
+            screenshot_url=record["screenshot_url"],
+            default_damage_type=default_damage_type_obj,
+            flavor_text=record["flavor_text"],
+            weapon_slot=record["weapon_slot"],
+            weapon_ammo_type=record["ammo_type"],
+            stat_group_hash=record["stat_group_hash"],
+            # season=season_obj,
         )
-
-        created_count += int(created)
-        updated_count += int(not created)
-
-        if damage_types_obj_list:
-            item_obj.damage_types.set(damage_types_obj_list)
-
-        if added_perks:
-            item_obj.perks.set(added_perks)
+        item_objs.append(item_obj)
 
         logger.info(
             f"Created EN - {tier_type_obj.name} {item_obj.get_localized_type()} "
@@ -491,22 +762,11 @@ def create_or_update_items(english_cursor, localized_cursors=None, exotic_only=F
         )
 
         # Populate item stats
-        item_stats = item_def.get("stats", {}).get("stats")
-        populate_item_stats(item=item_obj, i_def_stats=item_stats)
-        localized_item_defs = {
-            lang_code: {
-                row["hash"]: row
-                for row in load_table(
-                    cursor, "DestinyInventoryItemDefinition", extra_query=extra_query, hashset=(hash_id,)
-                )
-            }
-            for lang_code, cursor in localized_cursors.items()
-        }
+        stats_by_item[hash_id] = populate_item_stats(item=item_obj, stats=record["stats"], context=context)
 
         # Process localized item translations
-        for lang_code, defs in localized_item_defs.items():
-            item_def_lang = defs.get(int(hash_id), {})
-            name_lang = item_def_lang.get("displayProperties", {}).get("name")
+        translations_by_item[hash_id] = []
+        for lang_code, (name_lang, flavor_text_lang) in record["translations"].items():
             if not name_lang:
                 logger.critical(
                     "Error when processing %s -> Name not found for translation %s. Skipping",
@@ -514,16 +774,257 @@ def create_or_update_items(english_cursor, localized_cursors=None, exotic_only=F
                     lang_code.upper(),
                 )
                 continue
-            flavor_text_lang = item_def_lang.get("flavorText")
-
-            ItemTranslation.objects.update_or_create(
-                item=item_obj,
-                language=lang_code,
-                defaults={
-                    "name": name_lang,
-                    "flavor_text": flavor_text_lang,
-                },
+
+            translations_by_item[hash_id].append(
+                ItemTranslation(item=item_obj, language=lang_code, name=name_lang, flavor_text=flavor_text_lang)
             )
             logger.info(f"Created {lang_code.upper()} - ItemTranslation({name_lang}) for Item({api_name})")
 
+    # Write the perks whose definition changed
+    languages = sorted(translation_index.languages)
+    translation_index.load("DestinyInventoryItemDefinition", hashset=tuple(plug_defs))
+    existing_perk_fingerprints = dict(
+        Perk.objects.filter(id_bungie__in=plug_defs).values_list("id_bungie", "fingerprint")
+    )
+    perk_objs = []
+    perk_fingerprints = {}
+    for plug_hash, p_def in plug_defs.items():
+        localized_defs = [
+            translation_index.get("DestinyInventoryItemDefinition", lang_code, plug_hash) for lang_code in languages
+        ]
+        fingerprint = definition_fingerprint(p_def, *localized_defs)
+        if not force and existing_perk_fingerprints.get(plug_hash) == fingerprint:
+            continue
+        perk_fingerprints[plug_hash] = fingerprint
+        perk_objs.append(
+            Perk(
+                id_bungie=plug_hash,
+                name=p_def["displayProperties"]["name"],
+                desc=p_def["displayProperties"]["description"],
+                icon_url=p_def["displayProperties"].get("icon"),
+                is_intrinsic=True,
+            )
+        )
+        logger.info(f"Created EN - Perk({p_def['displayProperties']['name']})")
+
+    writer.upsert(
+        Perk,
+        perk_objs,
+        unique_fields=["id_bungie"],
+        update_fields=["name", "desc", "icon_url", "is_intrinsic"],
+    )
+    perks = Perk.objects.in_bulk(plug_defs, field_name="id_bungie")
+    for perk_obj in perk_objs:
+        perk_obj.pk = perks[perk_obj.id_bungie].pk
+    create_or_update_object_translations(
+        target_objects=perk_objs,
+        content_type=ContentType.objects.get_for_model(Perk),
+        translation_index=translation_index,
+        table_name="DestinyInventoryItemDefinition",
+        writer=writer,
+    )
+
+    # Write items, then resolve their pk for the dependent rows
+    writer.upsert(
+        Item,
+        item_objs,
+        unique_fields=["api_name"],
+        update_fields=[
+            "id_bungie",
+            "item_type",
+            "tier_type",
+            "class_type",
+            "category",
+            "icon_url",
+            "screenshot_url",
+            "default_damage_type",
+            "flavor_text",
+            "weapon_slot",
+            "weapon_ammo_type",
+            "stat_group_hash",
+            "is_active",
+        ],
+    )
+    # Items are matched on their unique api_name, an inactive item may share the hash of a current one
+    hashes_by_api_name = {record["api_name"]: record["hash"] for record in item_records}
+    item_ids = {
+        hashes_by_api_name[api_name]: item_id
+        for api_name, item_id in Item.objects.filter(api_name__in=hashes_by_api_name).values_list("api_name", "id")
+    }
+
+    item_stat_objs = []
+    item_translation_objs = []
+    for item_obj in item_objs:
+        item_obj.pk = item_ids[item_obj.id_bungie]
+        item_stat_objs.extend(stats_by_item[item_obj.id_bungie])
+        item_translation_objs.extend(translations_by_item[item_obj.id_bungie])
+
+    # Stats that are gone from a changed definition must not survive the upsert
+    writer.delete(ItemStat, "item_id", [item_obj.pk for item_obj in item_objs])
+    writer.upsert(ItemStat, item_stat_objs, unique_fields=["item", "stat_type"], update_fields=["value"])
+    writer.upsert(
+        ItemTranslation,
+        item_translation_objs,
+        unique_fields=["item", "language"],
+        update_fields=["name", "flavor_text"],
+    )
+    writer.replace_m2m(
+        Item.damage_types,
+        {item_ids[hash_id]: damage_type_ids for hash_id, damage_type_ids in damage_type_ids_by_item.items()},
+    )
+    writer.replace_m2m(
+        Item.perks,
+        {
+            item_ids[hash_id]: [perks[plug_hash].pk for plug_hash in plug_hashes]
+            for hash_id, plug_hashes in perk_hashes_by_item.items()
+        },
+    )
+    for perk_obj in perk_objs:
+        perk_obj.fingerprint = perk_fingerprints[perk_obj.id_bungie]
+    writer.update(Perk, perk_objs, fields=["fingerprint"])
+    for item_obj in item_objs:
+        item_obj.fingerprint = fingerprints_by_item[item_obj.id_bungie]
+    writer.update(Item, item_objs, fields=["fingerprint"])
+
+    # Aliases are written for unchanged items too, a new variant does not change the imported definition
+    alias_objs = [
+        ItemHashAlias(hash=alias_hash, item_id=item_ids[record["hash"]])
+        for record in item_records
+        for alias_hash in record.get("alias_hashes", [record["hash"]])
+    ]
+    writer.upsert(ItemHashAlias, alias_objs, unique_fields=["hash"], update_fields=["item"])
+    if not exotic_only:
+        alias_hashes = {alias_obj.hash for alias_obj in alias_objs}
+        writer.delete(
+            ItemHashAlias,
+            "hash",
+            [
+                alias_hash
+                for alias_hash in ItemHashAlias.objects.values_list("hash", flat=True)
+                if alias_hash not in alias_hashes
+            ],
+        )
+
+    # Items of a full import that are no longer in the manifest
+    removed_count = 0
+    if not exotic_only:
+        removed_count = remove_items(
+            set(Item.objects.filter(is_active=True).values_list("id", flat=True)) - set(item_ids.values()), writer
+        )
+
+    logger.info("Items : %i unchanged, %i removed", unchanged_count, removed_count)
+    created_count = sum(item_obj.api_name not in existing_api_names for item_obj in item_objs)
+    updated_count = len(item_objs) - created_count
     return created_count, updated_count
+
+
+def remove_items(item_ids, writer):
+    """
+    Take the items of `item_ids` out of the catalog. Items in the collection of a Bungie account are
+    only deactivated, so the account keeps them, the others are deleted. Returns the number of items removed.
+    """
+    owners = BungieAccount.items.through
+    owned_ids = set(owners.objects.filter(item_id__in=item_ids).values_list("item_id", flat=True))
+    if owned_ids:
+        deactivated = [Item(pk=item_id, is_active=False) for item_id in owned_ids]
+        writer.update(Item, deactivated, fields=["is_active"])
+        logger.warning(
+            "Kept %i removed items owned by Bungie accounts (%i account links) out of the catalog",
+            len(owned_ids),
+            owners.objects.filter(item_id__in=owned_ids).count(),
+        )
+    writer.delete(Item, "id", [item_id for item_id in item_ids if item_id not in owned_ids])
+    return len(item_ids)
+
+
+def create_or_update_items(
+    english_cursor,
+    localized_cursors=None,
+    exotic_only=False,
+    writer=None,
+    translation_index=None,
+    manifest_reader=None,
+    context=None,
+    force=False,
+    workers=TRANSFORM_WORKERS,
+):
+    """
+    Create or update Item objects and their related data from the manifest, see `build_item_records`
+    and `write_items`.
+    """
+    if not localized_cursors:
+        localized_cursors = {}
+    if translation_index is None:
+        translation_index = TranslationIndex(localized_cursors)
+
+    item_records, plug_defs = build_item_records(
+        english_cursor,
+        localized_cursors=localized_cursors,
+        exotic_only=exotic_only,
+        manifest_reader=manifest_reader,
+        workers=workers,
+    )
+    return write_items(
+        item_records,
+        plug_defs,
+        exotic_only=exotic_only,
+        writer=writer,
+        translation_index=translation_index,
+        context=context,
+        force=force,
+    )
+
+
+def write_item_translations(item_ids, translation_index, writer):
+    """
+    Upsert the ItemTranslation of the items of `item_ids` (`id_bungie -> pk`) in every language of
+    `translation_index`, read from the same databases. Returns the number of translations written.
+    """
+    hashset = tuple(item_ids)
+    localized_rows = (
+        map_languages(
+            lambda lang_code, cursor: load_item_translations(cursor, hashset),
+            translation_index.languages,
+            localized_cursors=translation_index.localized_cursors,
+            manifests=translation_index.manifests,
+        )
+        if hashset
+        else {}
+    )
+    translations = []
+    for lang_code, rows in localized_rows.items():
+        for row_id, (name, flavor_text) in rows.items():
+            if not name:
+                logger.critical("Name not found for %s translation of Item(%s). Skipping", lang_code.upper(), row_id)
+                continue
+            translations.append(
+                ItemTranslation(
+                    item_id=item_ids[unsigned_hash(row_id)], language=lang_code, name=name, flavor_text=flavor_text
+                )
+            )
+        logger.info("Got %i %s item translations", len(rows), lang_code.upper())
+    writer.upsert(
+        ItemTranslation, translations, unique_fields=["item", "language"], update_fields=["name", "flavor_text"]
+    )
+    return len(translations)
+
+
+def translate_catalog(translation_index, writer):
+    """
+    Write the translations of the imported catalog in every language of `translation_index`, without
+    touching items, stats or perks. Definitions are joined on the `id_bungie` of the existing objects.
+    """
+    for lookup in LOOKUPS.values():
+        lookup.write_translations(lookup.model.objects.all(), writer, translation_index)
+    create_or_update_object_translations(
+        target_objects=Perk.objects.all(),
+        content_type=ContentType.objects.get_for_model(Perk),
+        translation_index=translation_index,
+        table_name="DestinyInventoryItemDefinition",
+        writer=writer,
+    )
+    return write_item_translations(
+        dict(Item.objects.filter(is_active=True).values_list("id_bungie", "id")),
+        translation_index=translation_index,
+        writer=writer,
+    )
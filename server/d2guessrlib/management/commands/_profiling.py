@@ -0,0 +1,179 @@
+import json
+import logging
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from django.db import connection
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger("populate_db")
+
+
+def max_rss():
+    """
+    Peak resident memory of the process so far in bytes, 0 where it is not available.
+    """
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class QueryCounter:
+    """
+    Database execute wrapper counting the queries sent, without keeping them in memory.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class PhaseStats:
+    """
+    Wall time, queries, rows written per model and memory of one phase.
+
+    `max_rss` is the peak resident memory of the process at the end of the phase, `peak_memory` the peak
+    of memory traced during the phase, None unless memory is traced.
+    """
+
+    def __init__(self, name, nested=False):
+        self.name = name
+        self.nested = nested
+        self.started = 0.0
+        self.seconds = 0.0
+        self.queries = 0
+        self.rows = {}
+        self.peak_memory = None
+        self.max_rss = 0
+
+    def as_dict(self):
+        return {
+            "name": self.name,
+            "started": round(self.started, 3),
+            "seconds": round(self.seconds, 3),
+            "queries": self.queries,
+            "rows": sum(self.rows.values()),
+            "rows_by_model": self.rows,
+            "peak_memory": self.peak_memory,
+            "max_rss": self.max_rss,
+            "nested": self.nested,
+        }
+
+    def __str__(self):
+        memory = f"{self.max_rss / 1024 / 1024:.1f} MiB max RSS"
+        if self.peak_memory is not None:
+            memory += f", {self.peak_memory / 1024 / 1024:.1f} MiB traced peak"
+        return f"{self.name}: {self.seconds:.2f}s, {self.queries} queries, {sum(self.rows.values())} rows, {memory}"
+
+
+class PhaseProfiler:
+    """
+    Measure the phases of an import.
+
+    Each `phase()` block records when it started, its wall time, the queries sent on the connection of
+    its thread, the rows written through `writer` and the peak resident memory of the process.
+    With `trace_memory`, the peak of memory allocated while each phase ran is traced too, from the first
+    phase until `stop()`. Tracing slows allocations down several times, so it is opt-in. Phases run
+    concurrently share the writer and the traced memory, so their rows and peaks also count the work of
+    the others.
+    """
+
+    def __init__(self, writer=None, trace_memory=False):
+        self.writer = writer
+        self.trace_memory = trace_memory
+        self.phases = []
+        self.stages = []
+        self.critical_path = []
+        self._started = time.perf_counter()
+        self._tracing = False
+        self._lock = threading.Lock()
+
+    @property
+    def seconds(self):
+        return time.perf_counter() - self._started
+
+    def _rows_written(self):
+        if self.writer is None:
+            return {}
+        return {label: stats.rows for label, stats in self.writer.stats.items()}
+
+    @contextmanager
+    def phase(self, name):
+        if self.trace_memory:
+            with self._lock:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    self._tracing = True
+            tracemalloc.reset_peak()
+        stats = PhaseStats(name)
+        counter = QueryCounter()
+        rows_before = self._rows_written()
+        started = time.perf_counter()
+        stats.started = started - self._started
+        try:
+            with connection.execute_wrapper(counter):
+                yield stats
+        finally:
+            stats.seconds = time.perf_counter() - started
+            stats.queries = counter.count
+            if self.trace_memory:
+                stats.peak_memory = tracemalloc.get_traced_memory()[1]
+            stats.max_rss = max_rss()
+            stats.rows = {
+                label: rows - rows_before.get(label, 0)
+                for label, rows in self._rows_written().items()
+                if rows != rows_before.get(label, 0)
+            }
+            self.phases.append(stats)
+            logger.info("Phase %s", stats)
+
+    def record(self, name, seconds, rows):
+        """
+        Add the summary of work spread over other phases (e.g. translations), already counted in their time.
+        """
+        stats = PhaseStats(name, nested=True)
+        stats.seconds = seconds
+        stats.rows = {label: count for label, count in rows.items() if count}
+        self.phases.append(stats)
+        logger.info("Phase %s", stats)
+
+    def record_schedule(self, scheduler):
+        """
+        Keep when each stage of `scheduler` ran, relative to the start of the profiler, and its critical path.
+        """
+        offset = scheduler.started_at - self._started
+        self.stages = [
+            {**stage, "started": round(stage["started"] + offset, 3), "ended": round(stage["ended"] + offset, 3)}
+            for stage in scheduler.report()
+        ]
+        self.critical_path = scheduler.critical_path()
+        logger.info("Critical path: %s", " -> ".join(self.critical_path))
+
+    def stop(self):
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+
+    def report(self):
+        return {
+            "seconds": round(self.seconds, 3),
+            "phases": [stats.as_dict() for stats in self.phases],
+            "stages": self.stages,
+            "critical_path": self.critical_path,
+        }
+
+    def write_report(self, path, **extra):
+        with open(path, "w") as report_file:
+            json.dump({**extra, **self.report()}, report_file, indent=2)
@@ -0,0 +1,144 @@
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.db import connections
+
+logger = logging.getLogger("populate_db")
+
+STAGE_WORKERS = 4
+
+
+class Stage:
+    """
+    A step of an import, run once all the stages it `requires` are done.
+
+    `func` is called without arguments. Stages run on the scheduler's threads get their own database
+    connections, `main_thread` stages run on the calling thread and share its connection (and transaction).
+    """
+
+    def __init__(self, name, func, requires=(), main_thread=False):
+        self.name = name
+        self.func = func
+        self.requires = tuple(requires)
+        self.main_thread = main_thread
+        self.started = None
+        self.ended = None
+
+    @property
+    def seconds(self):
+        return self.ended - self.started
+
+    def as_dict(self):
+        return {
+            "name": self.name,
+            "requires": list(self.requires),
+            "started": round(self.started, 3),
+            "ended": round(self.ended, 3),
+        }
+
+
+class StageScheduler:
+    """
+    Run the stages of a dependency graph, each as soon as the stages it requires are done.
+
+    Independent stages run concurrently on a pool of `max_workers` threads, while `main_thread`
+    stages run one at a time on the calling thread. A stage raising an error stops the scheduling
+    of the others and the error is raised by `run()` once the running stages returned.
+    """
+
+    def __init__(self, max_workers=STAGE_WORKERS):
+        self.max_workers = max_workers
+        self.stages = {}
+        self.results = {}
+        self.started_at = None
+
+    def add(self, name, func, requires=(), main_thread=False):
+        if name in self.stages:
+            raise ValueError(f"Stage {name} is already scheduled")
+        self.stages[name] = Stage(name, func, requires=requires, main_thread=main_thread)
+        return self.stages[name]
+
+    def _check(self):
+        """
+        Raise ValueError if a stage requires an unknown stage or if the stages require each other.
+        """
+        for stage in self.stages.values():
+            unknown = set(stage.requires) - set(self.stages)
+            if unknown:
+                raise ValueError(f"Stage {stage.name} requires unknown stages {sorted(unknown)}")
+
+        done = set()
+        pending = set(self.stages)
+        while pending:
+            ready = {name for name in pending if set(self.stages[name].requires) <= done}
+            if not ready:
+                raise ValueError(f"Stages {sorted(pending)} require each other")
+            done |= ready
+            pending -= ready
+
+    def _run_stage(self, stage):
+        stage.started = time.perf_counter() - self.started_at
+        try:
+            return stage.func()
+        finally:
+            stage.ended = time.perf_counter() - self.started_at
+            logger.debug("Stage %s ran from %.2fs to %.2fs", stage.name, stage.started, stage.ended)
+
+    def _run_in_thread(self, stage):
+        try:
+            return self._run_stage(stage)
+        finally:
+            connections.close_all()
+
+    def run(self):
+        """
+        Run every stage. Returns the value returned by each stage, by name.
+        """
+        self._check()
+        self.started_at = time.perf_counter()
+        pending = dict(self.stages)
+        futures = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="stage") as executor:
+            try:
+                while pending or futures:
+                    ready = [stage for stage in pending.values() if set(stage.requires) <= set(self.results)]
+                    for stage in ready:
+                        if not stage.main_thread:
+                            del pending[stage.name]
+                            futures[executor.submit(self._run_in_thread, stage)] = stage
+
+                    main_ready = [stage for stage in ready if stage.main_thread]
+                    if main_ready:
+                        stage = main_ready[0]
+                        del pending[stage.name]
+                        self.results[stage.name] = self._run_stage(stage)
+                        continue
+
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        stage = futures.pop(future)
+                        self.results[stage.name] = future.result()
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+        return self.results
+
+    def critical_path(self):
+        """
+        Return the names of the chain of stages that ended last, each one preceded by the requirement
+        it waited for the longest.
+        """
+        ran = [stage for stage in self.stages.values() if stage.ended is not None]
+        if not ran:
+            return []
+        stage = max(ran, key=lambda stage: stage.ended)
+        path = [stage.name]
+        while stage.requires:
+            stage = max((self.stages[name] for name in stage.requires), key=lambda stage: stage.ended)
+            path.append(stage.name)
+        return path[::-1]
+
+    def report(self):
+        return [stage.as_dict() for stage in self.stages.values() if stage.ended is not None]
@@ -0,0 +1,199 @@
+import gzip
+import json
+import logging
+import os
+from itertools import groupby
+
+from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils import timezone
+
+from d2guessrlib.management.commands._bulk import DEFAULT_BATCH_SIZE, chunked
+from d2guessrlib.models import (
+    CatalogVersion,
+    Category,
+    ClassType,
+    ContentTranslation,
+    DamageType,
+    Item,
+    ItemHashAlias,
+    ItemStat,
+    ItemTranslation,
+    ManifestVersion,
+    Perk,
+    Season,
+    StatType,
+    TierType,
+)
+
+logger = logging.getLogger("populate_db")
+
+SNAPSHOT_FORMAT = "d2guessr-catalog"
+SNAPSHOT_VERSION = 1
+
+# Models of the catalog, each one after the models it references
+SNAPSHOT_MODELS = (
+    DamageType,
+    TierType,
+    Category,
+    ClassType,
+    StatType,
+    Season,
+    Perk,
+    Item,
+    Item.damage_types.through,
+    Item.perks.through,
+    ItemStat,
+    ItemTranslation,
+    ItemHashAlias,
+    ContentTranslation,
+)
+
+
+class SnapshotError(Exception):
+    """The snapshot cannot be loaded in this database."""
+
+
+def _columns(model):
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def _content_type_fields(model):
+    """
+    Columns of `model` referencing a ContentType, whose ids differ between databases.
+    """
+    return {
+        field.attname
+        for field in model._meta.concrete_fields
+        if field.is_relation and field.related_model is ContentType
+    }
+
+
+def write_snapshot(path, compresslevel=6):
+    """
+    Write the whole imported catalog to a gzip compressed snapshot at `path`.
+
+    The snapshot is a header line followed, for every model of `SNAPSHOT_MODELS`, by a line describing
+    its table and a line per row, all in JSON. Rows are lists of column values and keep their primary
+    keys, so the snapshot is loaded without resolving any relation. Content types are stored by name.
+    The file is only moved to `path` once complete. Returns the header and the number of rows of each table.
+    """
+    manifest_version = ManifestVersion.latest_imported()
+    header = {
+        "format": SNAPSHOT_FORMAT,
+        "version": SNAPSHOT_VERSION,
+        "created_at": timezone.now().isoformat(),
+        "manifest_version": manifest_version.version if manifest_version else None,
+        "catalog_version": CatalogVersion.current(),
+    }
+    exported = {}
+    content_type_names = {
+        content_type.pk: f"{content_type.app_label}.{content_type.model}" for content_type in ContentType.objects.all()
+    }
+
+    temp_path = f"{path}.part"
+    try:
+        with gzip.open(temp_path, "wt", encoding="utf-8", compresslevel=compresslevel) as snapshot:
+            snapshot.write(json.dumps(header) + "\n")
+            for model in SNAPSHOT_MODELS:
+                columns = _columns(model)
+                content_type_indexes = [columns.index(column) for column in _content_type_fields(model)]
+                snapshot.write(json.dumps({"table": model._meta.label_lower, "columns": columns}) + "\n")
+                rows = 0
+                queryset = model.objects.order_by("pk").values_list(*columns)
+                for row in queryset.iterator(chunk_size=DEFAULT_BATCH_SIZE):
+                    values = list(row)
+                    for index in content_type_indexes:
+                        values[index] = content_type_names[values[index]]
+                    snapshot.write(json.dumps(values, cls=DjangoJSONEncoder, separators=(",", ":")) + "\n")
+                    rows += 1
+                exported[model._meta.label_lower] = rows
+                logger.info("Exported %i %s rows", rows, model.__name__)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return header, exported
+
+
+def read_snapshot_header(snapshot):
+    header = json.loads(snapshot.readline() or "null")
+    if not isinstance(header, dict) or header.get("format") != SNAPSHOT_FORMAT:
+        raise SnapshotError("Not a catalog snapshot")
+    if header.get("version") != SNAPSHOT_VERSION:
+        raise SnapshotError(f"Snapshot version {header.get('version')} is not supported (expected {SNAPSHOT_VERSION})")
+    return header
+
+
+def iter_snapshot_tables(snapshot):
+    """
+    Yield the description of each table of `snapshot`, read past its header, with an iterator over its rows.
+    Rows must be consumed before the next table.
+    """
+    table = None
+
+    def table_of(value):
+        nonlocal table
+        if isinstance(value, dict):
+            table = value
+        return table
+
+    for table, values in groupby((json.loads(line) for line in snapshot), key=table_of):
+        yield table, (value for value in values if not isinstance(value, dict))
+
+
+def _load_table(table, rows, batch_size):
+    model = apps.get_model(table["table"])
+    unknown = set(table["columns"]) - set(_columns(model))
+    if unknown:
+        raise SnapshotError(f"Columns {sorted(unknown)} of {table['table']} do not exist in this database")
+    content_type_columns = _content_type_fields(model) & set(table["columns"])
+    content_types = {}
+
+    def build(row):
+        values = dict(zip(table["columns"], row))
+        for column in content_type_columns:
+            name = values[column]
+            if name not in content_types:
+                content_types[name] = ContentType.objects.get_by_natural_key(*name.split(".")).pk
+            values[column] = content_types[name]
+        return model(**values)
+
+    loaded = 0
+    for chunk in chunked((build(row) for row in rows), batch_size):
+        model.objects.bulk_create(chunk)
+        loaded += len(chunk)
+    logger.info("Imported %i %s rows", loaded, model.__name__)
+    return loaded
+
+
+def load_snapshot(path, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Load the snapshot at `path` (see `write_snapshot`) into a database without catalog, in a single
+    transaction. Primary keys are kept and the sequences reset after them. The manifest version of the
+    snapshot is recorded as imported, so populate_db only runs again for a newer manifest.
+    Returns the header of the snapshot and the number of rows loaded in each table.
+    """
+    if any(model.objects.exists() for model in SNAPSHOT_MODELS):
+        raise SnapshotError("The catalog is not empty")
+
+    with gzip.open(path, "rt", encoding="utf-8") as snapshot, transaction.atomic():
+        header = read_snapshot_header(snapshot)
+        loaded = {}
+        for table, rows in iter_snapshot_tables(snapshot):
+            loaded[table["table"]] = _load_table(table, rows, batch_size)
+
+        with connection.cursor() as cursor:
+            models = [apps.get_model(label) for label in loaded]
+            for statement in connection.ops.sequence_reset_sql(no_style(), models):
+                cursor.execute(statement)
+        if header["manifest_version"]:
+            ManifestVersion.objects.update_or_create(
+                version=header["manifest_version"], defaults={"imported_at": timezone.now()}
+            )
+        CatalogVersion.bump()
+    return header, loaded
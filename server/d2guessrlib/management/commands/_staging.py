@@ -0,0 +1,112 @@
+import logging
+
+from d2guessrlib.models import IngestionCheckpoint, IngestionRun, StagedRecord
+
+logger = logging.getLogger("populate_db")
+
+ITEM_RECORD = "item"
+PLUG_RECORD = "plug"
+
+DOWNLOAD_STAGE = "download"
+STAGE_ITEMS_STAGE = "stage_items"
+
+
+def stage_items(run, item_records, plug_defs, writer):
+    """
+    Save the item records and plug definitions of `run` to the staging table.
+
+    Rows are written in committed batches, outside of the transaction publishing the catalog.
+    """
+    staged = [StagedRecord(run=run, kind=ITEM_RECORD, key=record["hash"], payload=record) for record in item_records]
+    staged += [
+        StagedRecord(run=run, kind=PLUG_RECORD, key=plug_hash, payload=p_def) for plug_hash, p_def in plug_defs.items()
+    ]
+    writer.upsert(StagedRecord, staged, unique_fields=["run", "kind", "key"], update_fields=["payload"])
+    logger.info("Staged %i items and %i plugs", len(item_records), len(plug_defs))
+
+
+def batch_item_records(records, size):
+    """
+    Group the (record, plug definitions) pairs of `iter_item_records` into batches of `size` records.
+    Yields the records of each batch with the plug definitions they use.
+    """
+    item_records = []
+    plug_defs = {}
+    for record, record_plug_defs in records:
+        item_records.append(record)
+        plug_defs.update(record_plug_defs)
+        if len(item_records) == size:
+            yield item_records, plug_defs
+            item_records = []
+            plug_defs = {}
+    if item_records:
+        yield item_records, plug_defs
+
+
+def staged_item_hashes(run):
+    return set(run.staged_records.filter(kind=ITEM_RECORD).values_list("key", flat=True))
+
+
+def load_staged_items(run, chunk_size=2000):
+    """
+    Return the item records and plug definitions staged for `run`, as given to `stage_items`.
+    """
+    item_records = []
+    plug_defs = {}
+    staged = run.staged_records.filter(kind__in=(ITEM_RECORD, PLUG_RECORD)).order_by("pk")
+    for kind, key, payload in staged.values_list("kind", "key", "payload").iterator(chunk_size=chunk_size):
+        if kind == ITEM_RECORD:
+            item_records.append(payload)
+        else:
+            plug_defs[key] = payload
+    return item_records, plug_defs
+
+
+def clear_superseded(run, writer):
+    """
+    Remove the checkpoints and staged records of `run` and of every run started before it, once `run`
+    published the catalog. Failed runs of another manifest version, or without any checkpoint, are
+    never resumed and would otherwise leave their records behind.
+    """
+    run_ids = set(StagedRecord.objects.values_list("run_id", flat=True).distinct())
+    run_ids |= set(IngestionCheckpoint.objects.values_list("run_id", flat=True))
+    run_ids = list(
+        IngestionRun.objects.filter(pk__in=run_ids, started_at__lte=run.started_at)
+        .order_by()
+        .values_list("pk", flat=True)
+    )
+    IngestionCheckpoint.objects.filter(run_id__in=run_ids).delete()
+    return writer.delete(StagedRecord, "run_id", run_ids)
+
+
+def save_checkpoint(manifest_version, stage, run, batch=0, **payload):
+    """
+    Record that `stage` of the import of `manifest_version` reached `batch`, after the batch was committed.
+    """
+    IngestionCheckpoint.objects.update_or_create(
+        manifest_version=manifest_version, stage=stage, defaults={"run": run, "batch": batch, "payload": payload}
+    )
+
+
+def resume_checkpoints(manifest_version, run):
+    """
+    Hand the checkpoints and staged records left by the previous runs of `manifest_version` over to `run`.
+    Returns the checkpoints by stage.
+    """
+    checkpoints = IngestionCheckpoint.objects.filter(manifest_version=manifest_version)
+    previous_runs = set(checkpoints.exclude(run=run).values_list("run_id", flat=True))
+    StagedRecord.objects.filter(run_id__in=previous_runs).update(run=run)
+    checkpoints.update(run=run)
+    checkpoints = {checkpoint.stage: checkpoint for checkpoint in checkpoints}
+    for checkpoint in checkpoints.values():
+        logger.info("Resuming %s from batch %i", checkpoint.stage, checkpoint.batch)
+    return checkpoints
+
+
+def clear_checkpoints(manifest_version):
+    """
+    Remove the checkpoints of `manifest_version` and the records staged by the runs that saved them.
+    """
+    checkpoints = IngestionCheckpoint.objects.filter(manifest_version=manifest_version)
+    StagedRecord.objects.filter(run_id__in=checkpoints.values("run_id")).delete()
+    checkpoints.delete()
@@ -0,0 +1,185 @@
+import json
+import os
+import random
+import sqlite3
+
+from d2guessrlib.management.commands._manifest import signed_hash
+from d2guessrlib.management.commands._REFS import (
+    AMMO_TYPE,
+    CATEGORY_SLOT_HM,
+    CLASS_HM,
+    DAMAGE_TYPE_HM,
+    STATS_HM,
+    TIER_TYPE_HM,
+)
+
+WEAPON_CATEGORIES = (
+    "Auto",
+    "Revolver",
+    "Impulse",
+    "Scout",
+    "Fusion",
+    "Sniper",
+    "Shotgun",
+    "LMG",
+    "RPG",
+    "Pistol",
+    "Sword",
+    "GL",
+    "LinearFusion",
+    "Bow",
+    "Trace",
+    "Glaive",
+    "SMG",
+)
+ARMOR_CATEGORIES = ("Helmet", "Gauntlets", "Chest Armor", "Leg Armor", "Class Item")
+WEAPON_SLOTS = ("Kinetic", "Energy", "Power")
+# `classType` of armor definitions
+CLASS_TYPES = {"Titan": 0, "Hunter": 1, "Warlock": 2}
+TIER_TYPES = {"Legendary": 5, "Exotic": 6}
+
+
+def _display(name, description=""):
+    return {"displayProperties": {"name": name, "description": description, "icon": "/common/icon.png"}}
+
+
+class SyntheticManifest:
+    """
+    Generate manifest databases shaped like the ones served by Bungie, with a chosen number of definitions.
+
+    Only the tables and JSON fields read by `populate_db` are written. The lookup definitions (damage
+    types, tier types, categories, classes and stats) use the hashes of `_REFS`, the items and their
+    intrinsic plugs use random hashes drawn from `seed`, so the same arguments always give the same manifest.
+    """
+
+    def __init__(self, items=1000, plugs=100, stats=len(STATS_HM.get_values()), languages=("en", "fr"), seed=0):
+        if "en" not in languages:
+            languages = ("en", *languages)
+        self.items = items
+        self.plugs = plugs
+        self.stats = min(stats, len(STATS_HM.get_values()))
+        self.languages = tuple(languages)
+        self.seed = seed
+        rng = random.Random(seed)
+
+        reserved = {
+            *DAMAGE_TYPE_HM.get_values(),
+            *TIER_TYPE_HM.get_values(),
+            *CATEGORY_SLOT_HM.get_values(),
+            *STATS_HM.get_values(),
+        }
+        hashes = set()
+        while len(hashes) < items + plugs:
+            hash_id = rng.randrange(100, 2**32)
+            if hash_id not in reserved:
+                hashes.add(hash_id)
+        hashes = sorted(hashes)
+        rng.shuffle(hashes)
+        self.item_hashes = hashes[:items]
+        self.plug_hashes = hashes[items:]
+        self.stat_hashes = STATS_HM.get_values()[: self.stats]
+
+    def definitions(self, lang):
+        """
+        Return the definitions of every table in `lang`, as `{table_name: [definition]}`.
+        """
+        # Same draws for every language, only the texts differ
+        rng = random.Random(self.seed)
+        return {
+            "DestinyDamageTypeDefinition": [
+                {"hash": hash_id, **_display(f"{name} ({lang})")} for name, hash_id in DAMAGE_TYPE_HM.items()
+            ],
+            "DestinyItemTierTypeDefinition": [
+                {"hash": hash_id, **_display(f"{name} ({lang})")} for name, hash_id in TIER_TYPE_HM.items()
+            ],
+            "DestinyItemCategoryDefinition": [
+                {"hash": hash_id, **_display(f"{name} ({lang})")}
+                for name, hash_id in (*CATEGORY_SLOT_HM.items(), *CLASS_HM.items())
+            ],
+            "DestinyStatDefinition": [
+                {"hash": hash_id, **_display(f"{name} ({lang})", f"{name} description ({lang})")}
+                for name, hash_id in STATS_HM.items()
+            ],
+            "DestinyInventoryItemDefinition": [
+                *(self._plug(hash_id, index, lang) for index, hash_id in enumerate(self.plug_hashes)),
+                *(self._item(rng, hash_id, index, lang) for index, hash_id in enumerate(self.item_hashes)),
+            ],
+        }
+
+    def _plug(self, hash_id, index, lang):
+        return {
+            "hash": hash_id,
+            "itemTypeDisplayName": "Intrinsic",
+            **_display(f"Plug {index} ({lang})", f"Plug {index} description ({lang})"),
+        }
+
+    def _item(self, rng, hash_id, index, lang):
+        tier_name = rng.choice(tuple(TIER_TYPES))
+        is_weapon = rng.random() < 0.6
+        sockets = [{"singleInitialItemHash": rng.choice(self.plug_hashes)}] if self.plug_hashes else []
+        sockets.append({"singleInitialItemHash": 0})
+        definition = {
+            "hash": hash_id,
+            **_display(f"{tier_name} Item {index} ({lang})"),
+            "screenshot": "/common/screenshot.jpg",
+            "flavorText": f"Flavor text {index} ({lang})",
+            "inventory": {"tierType": TIER_TYPES[tier_name], "tierTypeHash": TIER_TYPE_HM[tier_name]},
+            "stats": {
+                "statGroupHash": rng.randrange(1, 2**32),
+                "stats": {str(stat_hash): {"value": rng.randrange(0, 101)} for stat_hash in self.stat_hashes},
+            },
+            "sockets": {"socketEntries": sockets},
+        }
+        if is_weapon:
+            damage_type_hashes = rng.sample(DAMAGE_TYPE_HM.get_values(), 2)
+            definition.update(
+                {
+                    "itemType": 3,
+                    "classType": 3,
+                    "itemCategoryHashes": [
+                        CATEGORY_SLOT_HM["Weapon"],
+                        CATEGORY_SLOT_HM[rng.choice(WEAPON_SLOTS)],
+                        CATEGORY_SLOT_HM[rng.choice(WEAPON_CATEGORIES)],
+                    ],
+                    "defaultDamageTypeHash": damage_type_hashes[0],
+                    "damageTypeHashes": damage_type_hashes,
+                    "equippingBlock": {"ammoType": rng.choice(AMMO_TYPE.get_values())},
+                }
+            )
+        else:
+            class_name = rng.choice(tuple(CLASS_TYPES))
+            definition.update(
+                {
+                    "itemType": 2,
+                    "classType": CLASS_TYPES[class_name],
+                    "itemCategoryHashes": [
+                        CATEGORY_SLOT_HM["Armor"],
+                        CLASS_HM[class_name],
+                        CATEGORY_SLOT_HM[rng.choice(ARMOR_CATEGORIES)],
+                    ],
+                }
+            )
+        return definition
+
+    def write(self, dest_dir):
+        """
+        Write a `world_sql_[lang_code].content` database per language in `dest_dir`.
+        Returns the database path of every language.
+        """
+        os.makedirs(dest_dir, exist_ok=True)
+        paths = {}
+        for lang in self.languages:
+            path = os.path.join(dest_dir, f"world_sql_{lang}.content")
+            if os.path.exists(path):
+                os.remove(path)
+            connection = sqlite3.connect(path)
+            with connection:
+                for table_name, rows in self.definitions(lang).items():
+                    connection.execute(f"CREATE TABLE {table_name} (id INTEGER PRIMARY KEY NOT NULL, json BLOB)")
+                    connection.executemany(
+                        f"INSERT INTO {table_name} (id, json) VALUES (?, ?)",
+                        ((signed_hash(row["hash"]), json.dumps(row)) for row in rows),
+                    )
+            connection.close()
+            paths[lang] = path
+        return paths
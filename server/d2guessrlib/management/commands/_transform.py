@@ -0,0 +1,93 @@
+import hashlib
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from d2guessrlib.management.commands._REFS import STATS_HM, classify_items
+
+# This module is imported by the transform worker processes: it must not depend on Django.
+
+TRANSFORM_WORKERS = 1
+TRANSFORM_CHUNK_SIZE = 250
+
+
+def definition_fingerprint(*definitions):
+    """
+    Hash the JSON of `definitions`, to detect the definitions that changed since the last import.
+    """
+    digest = hashlib.sha256()
+    for definition in definitions:
+        digest.update(json.dumps(definition, sort_keys=True, separators=(",", ":")).encode())
+    return digest.hexdigest()
+
+
+def _shape_definition(item_def, translations, classification_info):
+    translations = [tuple(translation) if translation else (None, None) for translation in translations]
+    display = item_def.get("displayProperties", {})
+    default_damage_type_hash = item_def.get("defaultDamageTypeHash")
+    tracked_stats = STATS_HM.hashes
+
+    return {
+        "hash": item_def["hash"],
+        "fingerprint": definition_fingerprint(item_def, translations),
+        "api_name": display.get("name"),
+        "icon_url": display.get("icon"),
+        "screenshot_url": item_def.get("screenshot"),
+        "flavor_text": item_def.get("flavorText"),
+        "item_type": classification_info["itemTypeHash"],
+        "category_hash": classification_info["categoryHash"],
+        "class_hash": classification_info["classHash"],
+        "weapon_slot": classification_info["weaponSlotHash"],
+        "tier_type_hash": item_def["inventory"]["tierTypeHash"],
+        "default_damage_type_hash": default_damage_type_hash,
+        "damage_type_hashes": item_def.get("damageTypeHashes") if default_damage_type_hash else [],
+        "ammo_type": item_def.get("equippingBlock", {}).get("ammoType") if default_damage_type_hash else None,
+        "stat_group_hash": item_def.get("stats", {}).get("statGroupHash"),
+        "stats": {
+            int(stat_hash): stat.get("value")
+            for stat_hash, stat in (item_def.get("stats", {}).get("stats") or {}).items()
+            if int(stat_hash) in tracked_stats
+        },
+        "plug_hashes": [
+            socket_entry["singleInitialItemHash"]
+            for socket_entry in item_def.get("sockets", {}).get("socketEntries", [])
+            if socket_entry.get("singleInitialItemHash")
+        ],
+        "translations": translations,
+    }
+
+
+def shape_items(rows):
+    """
+    Decode a batch of (item JSON, translations) rows and turn each item definition into a plain record
+    of the values stored for an Item.
+
+    `translations` are the (name, flavor text) of the item in each imported language, None when missing.
+    Foreign keys are left as Bungie hashes, to be resolved by the process writing to the database.
+    """
+    item_defs = [(json.loads(item_json), translations) for item_json, translations in rows]
+    classifications = classify_items(item_def.get("itemCategoryHashes") for item_def, _ in item_defs)
+    return [
+        _shape_definition(item_def, translations, classification_info)
+        for (item_def, translations), classification_info in zip(item_defs, classifications)
+    ]
+
+
+def transform_items(rows, workers=TRANSFORM_WORKERS, chunk_size=TRANSFORM_CHUNK_SIZE):
+    """
+    Shape `rows` of (item JSON, translations) into item records, in order.
+
+    With more than one worker, chunks of `chunk_size` rows are decoded and shaped by a pool of
+    processes while the caller consumes the records already done. Manifests of a single chunk
+    are shaped in the calling process, as starting the pool would cost more than it saves.
+    """
+    rows = list(rows)
+    if workers <= 1 or len(rows) <= chunk_size:
+        yield from shape_items(rows)
+        return
+
+    chunks = [rows[start : start + chunk_size] for start in range(0, len(rows), chunk_size)]
+    # Spawned workers only import this module, not the parent's state (e.g. its database connections)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        for records in executor.map(shape_items, chunks):
+            yield from records
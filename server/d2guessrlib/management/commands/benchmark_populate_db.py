@@ -0,0 +1,100 @@
+import json
+import logging
+import tempfile
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_databases, teardown_databases
+
+from d2guessrlib.management.commands._profiling import QueryCounter
+from d2guessrlib.management.commands._synthetic import SyntheticManifest
+from d2guessrlib.models import IngestionRun
+
+logger = logging.getLogger("populate_db")
+
+DEFAULT_SIZES = [100, 1000, 5000]
+
+
+def measure_populate_db(local_path, **options):
+    """
+    Run `populate_db --use-local` on the manifest files of `local_path`.
+    Returns the wall time in seconds, the number of queries and the peak of memory in bytes: allocated
+    during the run with `trace_memory`, else resident in the process since it started.
+    """
+    counter = QueryCounter()
+    started = time.perf_counter()
+    with connection.execute_wrapper(counter):
+        call_command("populate_db", use_local=True, local_path=str(local_path), **options)
+    seconds = time.perf_counter() - started
+    memory_key = "peak_memory" if options.get("trace_memory") else "max_rss"
+    peak_memory = max((phase[memory_key] or 0 for phase in IngestionRun.objects.first().phases), default=0)
+    return {"seconds": seconds, "queries": counter.count, "peak_memory": peak_memory}
+
+
+def run_benchmark(sizes, plugs_ratio=0.1, languages=("en", "fr"), repeat=1, seed=0, trace_memory=False):
+    """
+    Measure an import of a synthetic manifest of every size in `sizes` (number of items), on the current
+    database. The database is flushed before each run, so every run is a first import.
+    """
+    results = []
+    for size in sizes:
+        manifest = SyntheticManifest(items=size, plugs=max(1, int(size * plugs_ratio)), languages=languages, seed=seed)
+        with tempfile.TemporaryDirectory(prefix="synthetic_manifest_") as local_path:
+            manifest.write(local_path)
+            for run in range(1, repeat + 1):
+                call_command("flush", interactive=False, verbosity=0)
+                measured = measure_populate_db(
+                    local_path, languages=list(manifest.languages), trace_memory=trace_memory
+                )
+                result = {"items": size, "plugs": manifest.plugs, "run": run, **measured}
+                logger.info("Benchmark %s", result)
+                results.append(result)
+    return results
+
+
+class Command(BaseCommand):
+    help = "Measure populate_db on synthetic manifests of several sizes, in a throwaway test database"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Number of items of each synthetic manifest"
+        )
+        parser.add_argument(
+            "--plugs-ratio", type=float, default=0.1, help="Number of intrinsic plugs per item in the manifests"
+        )
+        parser.add_argument("--languages", nargs="+", default=["en", "fr"], help="Languages of the manifests")
+        parser.add_argument("--repeat", type=int, default=1, help="Number of runs of each size")
+        parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic manifests")
+        parser.add_argument(
+            "--trace-memory",
+            action="store_true",
+            help="Report the memory allocated by the runs instead of the peak resident memory, at the cost of speed",
+        )
+        parser.add_argument("--output", type=str, default=None, help="Write the results to this JSON file")
+
+    def handle(self, *args, **options):
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={"default"})
+        try:
+            results = run_benchmark(
+                options["sizes"],
+                plugs_ratio=options["plugs_ratio"],
+                languages=options["languages"],
+                repeat=options["repeat"],
+                seed=options["seed"],
+                trace_memory=options["trace_memory"],
+            )
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+        self.stdout.write(f"{'items':>8} {'run':>4} {'seconds':>9} {'queries':>8} {'peak MiB':>9}")
+        for result in results:
+            self.stdout.write(
+                f"{result['items']:>8} {result['run']:>4} {result['seconds']:>9.2f} {result['queries']:>8} "
+                f"{result['peak_memory'] / 1024 / 1024:>9.1f}"
+            )
+
+        if options["output"]:
+            with open(options["output"], "w") as output_file:
+                json.dump(results, output_file, indent=2)
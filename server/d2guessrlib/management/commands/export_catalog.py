@@ -0,0 +1,26 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from d2guessrlib.management.commands._snapshot import write_snapshot
+
+logger = logging.getLogger("populate_db")
+
+
+class Command(BaseCommand):
+    help = "Export the imported catalog to a compressed snapshot, to be loaded with import_catalog"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", type=str, help="Snapshot file to write, e.g. catalog.jsonl.gz")
+        parser.add_argument(
+            "--compress-level", type=int, default=6, choices=range(1, 10), help="gzip compression level"
+        )
+
+    def handle(self, *args, **options):
+        header, exported = write_snapshot(options["path"], compresslevel=options["compress_level"])
+        logger.info(
+            "Exported %i rows of manifest %s to %s",
+            sum(exported.values()),
+            header["manifest_version"],
+            options["path"],
+        )
@@ -0,0 +1,30 @@
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+from d2guessrlib.management.commands._bulk import DEFAULT_BATCH_SIZE
+from d2guessrlib.management.commands._snapshot import SnapshotError, load_snapshot
+
+logger = logging.getLogger("populate_db")
+
+
+class Command(BaseCommand):
+    help = "Load a catalog snapshot written by export_catalog into a database without catalog"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", type=str, help="Snapshot file to load")
+        parser.add_argument(
+            "--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Number of rows inserted per statement"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            header, loaded = load_snapshot(options["path"], batch_size=options["batch_size"])
+        except SnapshotError as e:
+            raise CommandError(f"Cannot import {options['path']}: {e}") from e
+        logger.info(
+            "Imported %i rows of manifest %s from %s",
+            sum(loaded.values()),
+            header["manifest_version"],
+            options["path"],
+        )
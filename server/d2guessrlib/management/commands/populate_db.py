@@ -1,26 +1,72 @@
-import io
+import glob
 import logging
 import os
-import sqlite3
 import zipfile
-from datetime import datetime
+from functools import partial
 
 import requests
 from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
 
+from d2guessrlib.cache import forget_catalog_version
+from d2guessrlib.management.commands._bulk import DEFAULT_BATCH_SIZE, bulk_writer
+from d2guessrlib.management.commands._manifest import (
+    DOWNLOAD_WORKERS,
+    MAX_OPEN_MANIFESTS,
+    ManifestReader,
+    ManifestSet,
+    download_manifest_databases,
+    file_checksum,
+)
 from d2guessrlib.management.commands._populate_tools import (
-    create_or_update_categories,
-    create_or_update_classes,
-    create_or_update_damage_types,
-    create_or_update_items,
-    create_or_update_stat_types,
-    create_or_update_tier_types,
+    LOOKUPS,
+    IngestionContext,
+    TranslationIndex,
+    iter_item_records,
+    translate_catalog,
+    write_items,
+)
+from d2guessrlib.management.commands._profiling import PhaseProfiler
+from d2guessrlib.management.commands._scheduler import STAGE_WORKERS, StageScheduler
+from d2guessrlib.management.commands._staging import (
+    DOWNLOAD_STAGE,
+    STAGE_ITEMS_STAGE,
+    batch_item_records,
+    clear_checkpoints,
+    clear_superseded,
+    load_staged_items,
+    resume_checkpoints,
+    save_checkpoint,
+    stage_items,
+    staged_item_hashes,
 )
+from d2guessrlib.models import CatalogVersion, ContentTranslation, IngestionRun, ItemTranslation, ManifestVersion
 
 logger = logging.getLogger("populate_db")
 
 
+# Languages imported besides English by default, "all" imports every language of the manifest
 SELECTED_LANGUAGES = ["fr"]
+ALL_LANGUAGES = "all"
+BUNGIE_BASE_URL = "https://www.bungie.net"
+MANIFEST_URL = f"{BUNGIE_BASE_URL}/Platform/Destiny2/Manifest/"
+# Options saved with each IngestionRun
+RUN_OPTIONS = (
+    "force_update",
+    "use_local",
+    "local_path",
+    "exotic_only",
+    "languages",
+    "translations_only",
+    "batch_size",
+    "download_workers",
+    "workers",
+    "stage_workers",
+    "max_open_manifests",
+    "resume",
+    "trace_memory",
+)
 
 
 class Command(BaseCommand):
@@ -30,7 +76,7 @@ class Command(BaseCommand):
         parser.add_argument(
             "--force-update",
             action="store_true",
-            help="Update database even if up to date",
+            help="Update database even if up to date, rewriting items whose definition did not change",
         )
         parser.add_argument("--use-local", action="store_true", help="Use existing local files")
         parser.add_argument(
@@ -44,121 +90,402 @@ class Command(BaseCommand):
         parser.add_argument(
             "--exotic-only", default=False, action="store_true", help="Download data on exotic items only"
         )
+        parser.add_argument(
+            "--languages",
+            nargs="+",
+            default=SELECTED_LANGUAGES,
+            help=f"Languages imported besides English, or '{ALL_LANGUAGES}' for every language of the manifest",
+        )
+        parser.add_argument(
+            "--translations-only",
+            action="store_true",
+            help="Only write the translations of the catalog already imported, e.g. to add a language",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help="Number of rows written per bulk statement and transaction",
+        )
+        parser.add_argument(
+            "--download-workers",
+            type=int,
+            default=DOWNLOAD_WORKERS,
+            help="Number of manifest databases downloaded at the same time",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Number of processes decoding and shaping item definitions",
+        )
+        parser.add_argument(
+            "--stage-workers",
+            type=int,
+            default=STAGE_WORKERS,
+            help="Number of threads reading the lookup definitions while the items are staged",
+        )
+        parser.add_argument(
+            "--max-open-manifests",
+            type=int,
+            default=MAX_OPEN_MANIFESTS,
+            help="Number of manifest databases read at the same time by the stages, whatever the number of "
+            "languages. The English database stays open for the whole run on top of them",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Continue the last failed import of the same manifest from its last committed batch",
+        )
+        parser.add_argument(
+            "--report",
+            type=str,
+            default=None,
+            help="Write the time, queries, rows and memory of each phase to this JSON file",
+        )
+        parser.add_argument(
+            "--trace-memory",
+            action="store_true",
+            help="Trace the memory allocated by each phase, which makes the import several times slower",
+        )
 
         return parser
 
+    def fetch_manifest(self, force_update=False):
+        """
+        Get the manifest description from bungie.net.
+
+        The request is conditional on the last imported version, and a version that was already imported
+        (by this node or any other one sharing the database) is skipped unless `force_update` is set.
+        Returns the manifest and the response headers, or the IngestionRun status to end with if there
+        is nothing to import.
+        """
+        latest_version = ManifestVersion.latest_imported()
+        headers = latest_version.conditional_headers() if latest_version and not force_update else {}
+        try:
+            logger.debug("Getting Manifest from bungie.net")
+            res = requests.get(MANIFEST_URL, headers=headers, timeout=20)
+            res.raise_for_status()
+        except requests.RequestException as e:
+            logger.error("ConnectionError when getting dbs: %r", e)
+            return IngestionRun.Status.FAILED
+
+        if res.status_code == 304:
+            logger.info("Already up to date (%s).", latest_version.version)
+            return IngestionRun.Status.SKIPPED
+
+        manifest = res.json().get("Response")
+        if not manifest:
+            logger.error("Unexpected response from Bungie.")
+            return IngestionRun.Status.FAILED
+
+        imported = ManifestVersion.objects.filter(version=manifest.get("version"), imported_at__isnull=False)
+        if imported.exists() and not force_update:
+            logger.info("Already up to date (%s).", manifest.get("version"))
+            return IngestionRun.Status.SKIPPED
+        return manifest, res.headers
+
     def handle(self, *args, **options):
-        start = datetime.now()
+        writer = bulk_writer(batch_size=options["batch_size"])
+        profiler = PhaseProfiler(writer=writer, trace_memory=options["trace_memory"])
+        run = IngestionRun.objects.create(options={option: options[option] for option in RUN_OPTIONS})
+        try:
+            run.status = self.populate(run, writer, profiler, **options)
+        except BaseException:
+            run.status = IngestionRun.Status.FAILED
+            raise
+        finally:
+            profiler.stop()
+            run.seconds = profiler.seconds
+            run.phases = profiler.report()["phases"]
+            run.critical_path = profiler.critical_path
+            run.save()
+            logger.info("Ended populate_db in %.1f seconds (%s)", run.seconds, run.status)
+            if options["report"]:
+                profiler.write_report(options["report"], status=run.status, manifest_version=run.manifest_version)
+
+    def populate(self, run, writer, profiler, **options):
+        """
+        Import the manifest, measuring each phase with `profiler`. Returns the status of `run`.
+
+        Each stage saves a checkpoint keyed by the manifest version once its work is committed, and
+        `--resume` continues a failed import of the same manifest from them.
+        """
         if not options["use_local"]:
-            # 1. Download sqlite db from bungie.net
-            manifest_url = "https://www.bungie.net/Platform/Destiny2/Manifest/"
-            try:
-                logger.debug("Getting Manifest from bungie.net")
-                res = requests.get(manifest_url, timeout=20)
-                res.raise_for_status()
-            except requests.RequestException as e:
-                logger.error("ConnectionError when getting dbs: %r", e)
-                return
-
-            manifest = res.json().get("Response")
-            if not manifest:
-                logger.error("Unexpected response from Bungie.")
-                return
-
-            with open("manifest_version.txt", "a+") as m_file:
-                current_version = m_file.read()
-                bungie_version = manifest.get("version")
-                if current_version == bungie_version and not options["force_update"]:
-                    logger.info("Already up to date.")
-                    return
+            # 1. Download sqlite db from bungie.net, unless this manifest was already imported
+            with profiler.phase("manifest"):
+                fetched = self.fetch_manifest(force_update=options["force_update"] or options["translations_only"])
+            if not isinstance(fetched, tuple):
+                return fetched
+            manifest, manifest_headers = fetched
+            run.manifest_version = checkpoint_version = manifest.get("version")
+            # Translations alone leave the checkpoints of the full imports of this version alone
+            checkpoints = (
+                {} if options["translations_only"] else self.checkpoints(checkpoint_version, run, options["resume"])
+            )
 
             # 2. Choose languages
-            en_path = manifest["mobileWorldContentPaths"].get("en")
-            languages_paths = {
-                lang_code: manifest["mobileWorldContentPaths"].get(lang_code) for lang_code in SELECTED_LANGUAGES
-            }
-
-            base_url = "https://www.bungie.net"
-            paths = {
-                "en": base_url + en_path,
-                **{lang_code: base_url + lang_path for lang_code, lang_path in languages_paths.items()},
-            }
-            conn = {}
-            try:
-                for lang, url in paths.items():
-                    logger.debug("Getting sqlite_db %s from %s", lang, url)
-                    r = requests.get(url, timeout=20)
-                    r.raise_for_status()
-                    with zipfile.ZipFile(io.BytesIO(r.content)) as z:
-                        name = z.namelist()[0]
-                        content = z.read(name)
-                    temp_file = f"world_sql_{lang}.content"
-                    with open(temp_file, "wb") as f:
-                        f.write(content)
-                    conn[lang] = sqlite3.connect(temp_file)
-                    logger.debug("Generated connection for %s", temp_file)
-            except requests.RequestException as e:
-                logger.error("Error when downloading manifest: %r", e)
-                return
-            except zipfile.BadZipFile as e:
-                logger.error("Error when unzipping manifest: %r", e)
-                return
-            except Exception as e:
-                logger.error("Error when opening manifest: %r", e)
-                return
+            available = set(manifest["mobileWorldContentPaths"]) - {"en"}
+            languages = self.select_languages(options["languages"], available)
+            unknown = set(languages) - available
+            if unknown:
+                logger.error("Languages not in the manifest: %s", ", ".join(sorted(unknown)))
+                return IngestionRun.Status.FAILED
+            if not options["translations_only"]:
+                languages = ["en", *languages]
+            content_paths = {lang_code: manifest["mobileWorldContentPaths"][lang_code] for lang_code in languages}
+            with profiler.phase("download"):
+                opened = self.download(run, checkpoint_version, checkpoints, content_paths, **options)
+            if not isinstance(opened, tuple):
+                return opened
+            paths, checksums = opened
         else:
-            conn = {}
-            for lang_code in SELECTED_LANGUAGES + ["en"]:
-                try:
-                    conn[lang_code] = sqlite3.connect(
-                        os.path.join(options["local_path"], f"world_sql_{lang_code}.content")
-                    )
-                except Exception as e:
-                    logger.critical(f"Couldn't load {lang_code} cursor: {repr(e)}")
+            local_files = glob.glob(os.path.join(options["local_path"], "world_sql_*.content"))
+            available = {os.path.basename(path)[len("world_sql_") : -len(".content")] for path in local_files} - {"en"}
+            paths = {}
+            languages = self.select_languages(options["languages"], available)
+            for lang_code in languages if options["translations_only"] else ["en", *languages]:
+                path = os.path.join(options["local_path"], f"world_sql_{lang_code}.content")
+                if not os.path.exists(path):
+                    logger.critical(f"Couldn't find {lang_code} manifest: {path}")
                     continue
+                paths[lang_code] = path
+            if not options["translations_only"]:
+                # Local files have no version, checkpoints are keyed by their content
+                en_path = os.path.join(options["local_path"], "world_sql_en.content")
+                checkpoint_version = f"local-{file_checksum(en_path)[:32]}"
+                checkpoints = self.checkpoints(checkpoint_version, run, options["resume"])
+
+        if options["translations_only"]:
+            return self.translate(paths, writer, profiler, **options)
+
+        # English stays open for the whole run, outside of the --max-open-manifests cap. The other
+        # languages are opened through `manifests` by whichever stage reads them.
+        english = ManifestReader.open(paths["en"])
+        try:
+            manifests = ManifestSet(paths, max_open=options["max_open_manifests"])
+            logger.info("Importing EN and %s", ", ".join(lang.upper() for lang in manifests.localized_languages))
+            translation_index = TranslationIndex(manifests=manifests)
+
+            # 3. Run the stages of the import as a dependency graph. Lookups only read the manifest, each on
+            # connections of its own, so they run concurrently while the items are staged.
+            scheduler = StageScheduler(max_workers=options["stage_workers"])
+            for name in LOOKUPS:
+                scheduler.add(name, partial(self.prepare_lookup, name, manifests, profiler))
+            scheduler.add(
+                STAGE_ITEMS_STAGE,
+                partial(
+                    self.stage, run, checkpoint_version, checkpoints, english, manifests, writer, profiler, **options
+                ),
+                main_thread=True,
+            )
+
+            # 4. Publish the whole catalog at once: readers see either the previous catalog or the new one
+            manifest_version = None
+            if not options["use_local"]:
+                # Record manifest version if online update, so that no node imports it again
+                manifest_version = {
+                    "version": manifest.get("version"),
+                    "content_paths": content_paths,
+                    "checksums": checksums,
+                    "etag": manifest_headers.get("ETag", ""),
+                    "last_modified": manifest_headers.get("Last-Modified", ""),
+                }
+            scheduler.add(
+                "publish",
+                partial(
+                    self.publish,
+                    run,
+                    scheduler.results,
+                    translation_index,
+                    writer,
+                    profiler,
+                    manifest_version,
+                    **options,
+                ),
+                requires=[*LOOKUPS, STAGE_ITEMS_STAGE],
+                main_thread=True,
+            )
+            try:
+                scheduler.run()
+            finally:
+                profiler.record_schedule(scheduler)
+            clear_superseded(run, writer)
 
-        english_cursor = conn["en"].cursor()
-        localized_cursors = {lang_code: conn.cursor() for lang_code, conn in conn.items() if lang_code != "en"}
+            # Translations are loaded and written by every stage above
+            translation_indexes = [translation_index, *(scheduler.results[name][1] for name in LOOKUPS)]
+            translation_stats = [
+                writer.stats[model.__name__]
+                for model in (ContentTranslation, ItemTranslation)
+                if model.__name__ in writer.stats
+            ]
+            profiler.record(
+                "translations",
+                seconds=sum(index.seconds for index in translation_indexes)
+                + sum(stats.seconds for stats in translation_stats),
+                rows={stats.label: stats.rows for stats in translation_stats},
+            )
+            writer.log_stats()
+        finally:
+            # Also closed when a stage fails, the import may be resumed by the same process
+            english.close()
+        return IngestionRun.Status.SUCCEEDED
 
-        # 3. Import DamageTypes
-        created_count, updated_count = create_or_update_damage_types(
-            english_cursor, localized_cursors=localized_cursors
+    def translate(self, paths, writer, profiler, **options):
+        """
+        Write the translations of the catalog already imported in the languages of `paths`, in one transaction.
+        """
+        manifests = ManifestSet(paths, max_open=options["max_open_manifests"])
+        if not manifests.localized_languages:
+            logger.error("No language to translate")
+            return IngestionRun.Status.FAILED
+
+        with profiler.phase("translations"), transaction.atomic():
+            item_count = translate_catalog(TranslationIndex(manifests=manifests), writer)
+            logger.info("Published catalog version %i", CatalogVersion.bump())
+            transaction.on_commit(forget_catalog_version)
+        logger.info(
+            "Translated %i items in %s", item_count, ", ".join(lang.upper() for lang in manifests.localized_languages)
         )
-        logger.info("DamageTypes : Created %i, Updated %i", created_count, updated_count)
+        writer.log_stats()
+        return IngestionRun.Status.SUCCEEDED
+
+    def select_languages(self, languages, available):
+        """
+        Return the languages to import besides English, every `available` one if `languages` is "all".
+        """
+        if ALL_LANGUAGES in languages:
+            return sorted(available)
+        return [lang_code for lang_code in dict.fromkeys(languages) if lang_code != "en"]
+
+    def checkpoints(self, checkpoint_version, run, resume):
+        """
+        Return the checkpoints to resume from by stage, and forget them if `resume` is not set.
+        """
+        if resume:
+            return resume_checkpoints(checkpoint_version, run)
+        clear_checkpoints(checkpoint_version)
+        return {}
 
-        # 4. Import TierTypes
-        created_count, updated_count = create_or_update_tier_types(english_cursor, localized_cursors=localized_cursors)
-        logger.info("Tier Types : Created %i, Updated %i", created_count, updated_count)
+    def download(self, run, checkpoint_version, checkpoints, content_paths, **options):
+        """
+        Download the manifest database of every language in `content_paths`.
 
-        # 5. Import Categories
-        created_count, updated_count = create_or_update_categories(english_cursor, localized_cursors=localized_cursors)
-        logger.info("Categories : Created %i, Updated %i", created_count, updated_count)
+        Databases downloaded by a previous attempt are reused if their checksum matches its checkpoint.
+        Returns the paths and checksums by language, or the IngestionRun status to end with.
+        """
+        checkpoint = checkpoints.get(DOWNLOAD_STAGE)
+        paths = {}
+        checksums = {}
+        if checkpoint:
+            for lang_code, checksum in checkpoint.payload["checksums"].items():
+                path = checkpoint.payload["paths"][lang_code]
+                if lang_code in content_paths and os.path.exists(path) and file_checksum(path) == checksum:
+                    paths[lang_code] = path
+                    checksums[lang_code] = checksum
+            logger.info("Reusing downloaded manifest for %s", ", ".join(lang.upper() for lang in paths) or "none")
+        urls = {
+            lang_code: BUNGIE_BASE_URL + lang_path
+            for lang_code, lang_path in content_paths.items()
+            if lang_code not in paths
+        }
+        try:
+            # Each language is unzipped by its download worker, as soon as it is downloaded
+            if urls:
+                paths.update(download_manifest_databases(urls, dest_dir=".", max_workers=options["download_workers"]))
+            for lang_code, temp_file in paths.items():
+                checksums.setdefault(lang_code, file_checksum(temp_file))
+        except requests.RequestException as e:
+            logger.error("Error when downloading manifest: %r", e)
+            return IngestionRun.Status.FAILED
+        except zipfile.BadZipFile as e:
+            logger.error("Error when unzipping manifest: %r", e)
+            return IngestionRun.Status.FAILED
+        except Exception as e:
+            logger.error("Error when reading manifest: %r", e)
+            return IngestionRun.Status.FAILED
+        if not options["translations_only"]:
+            save_checkpoint(checkpoint_version, DOWNLOAD_STAGE, run, paths=paths, checksums=checksums)
+        return paths, checksums
 
-        # 6. Import Classes
-        created_count, updated_count = create_or_update_classes(english_cursor, localized_cursors=localized_cursors)
-        logger.info("Classes : Created %i, Updated %i", created_count, updated_count)
+    def prepare_lookup(self, name, manifests, profiler):
+        """
+        Read the objects of the lookup `name` and index their translations, on connections of its own to
+        the databases of `manifests`. Returns the objects and their TranslationIndex.
+        """
+        lookup = LOOKUPS[name]
+        with profiler.phase(name):
+            translation_index = TranslationIndex(manifests=manifests)
+            objs = lookup.prepare(partial(manifests.cursor, "en"), translation_index)
+        return objs, translation_index
 
-        # 7. Import Stat Types
-        created_count, updated_count = create_or_update_stat_types(english_cursor, localized_cursors=localized_cursors)
-        logger.info("Stat Types : Created %i, Updated %i", created_count, updated_count)
+    def stage(self, run, checkpoint_version, checkpoints, english, manifests, writer, profiler, **options):
+        """
+        Stage the item records of the manifest, saving a checkpoint after each committed batch.
+        Items staged by a previous attempt are not read again.
+        """
+        with profiler.phase(STAGE_ITEMS_STAGE):
+            self._stage(run, checkpoint_version, checkpoints, english, manifests, writer, **options)
 
-        # 7. Import Seasons
-        # created_count, updated_count = create_or_update_seasons(english_cursor, localized_cursors=localized_cursors)
-        # logger.info("Seasons : Created %i, Updated %i", created_count, updated_count)
+    def _stage(self, run, checkpoint_version, checkpoints, english, manifests, writer, **options):
+        checkpoint = checkpoints.get(STAGE_ITEMS_STAGE)
+        if checkpoint and checkpoint.payload.get("done"):
+            logger.info("Items already staged")
+            return
 
-        # 9. Import Items
-        exotic_only = options["exotic_only"]
-        created_count, updated_count = create_or_update_items(
-            english_cursor, localized_cursors=localized_cursors, exotic_only=exotic_only
+        staged_hashes = staged_item_hashes(run)
+        batch = checkpoint.batch if checkpoint else 0
+        records = iter_item_records(
+            english.cursor(),
+            manifests=manifests,
+            exotic_only=options["exotic_only"],
+            manifest_reader=english,
+            workers=options["workers"],
+            skip_hashes=staged_hashes,
         )
-        logger.info("Items : Created %i, Updated %i", created_count, updated_count)
+        for item_records, plug_defs in batch_item_records(records, writer.batch_size):
+            stage_items(run, item_records, plug_defs, writer)
+            batch += 1
+            save_checkpoint(checkpoint_version, STAGE_ITEMS_STAGE, run, batch=batch)
+        save_checkpoint(checkpoint_version, STAGE_ITEMS_STAGE, run, batch=batch, done=True)
 
-        for key in conn:
-            conn[key].close()
-        end = datetime.now()
-        logger.info("Ended populate_db in %i seconds", (end - start).seconds)
+    def publish(self, run, prepared, translation_index, writer, profiler, manifest_version=None, **options):
+        """
+        Write the lookups `prepared` by their stages and the items staged for `run`, in a single transaction
+        that also bumps the catalog version and records `manifest_version` as imported.
+        """
+        with transaction.atomic():
+            # 5. Import DamageTypes, TierTypes, Categories, Classes and Stat Types
+            with profiler.phase("lookups"):
+                for name, lookup in LOOKUPS.items():
+                    objs, lookup_translation_index = prepared[name]
+                    created_count, updated_count = lookup.write(objs, writer, lookup_translation_index)
+                    logger.info("%s : Created %i, Updated %i", lookup.model.__name__, created_count, updated_count)
 
-        # 10. Update manifest version if online update
-        if not options["use_local"]:
-            with open("manifest_version.txt", "w") as m_file:
-                m_file.write(manifest.get("version"))
+            # Import Seasons
+            # created_count, updated_count = create_or_update_seasons(
+            #     english_cursor, localized_cursors=localized_cursors
+            # )
+            # logger.info("Seasons : Created %i, Updated %i", created_count, updated_count)
+
+            # 6. Import Items
+            with profiler.phase("items"):
+                item_records, plug_defs = load_staged_items(run)
+                created_count, updated_count = write_items(
+                    item_records,
+                    plug_defs,
+                    exotic_only=options["exotic_only"],
+                    writer=writer,
+                    translation_index=translation_index,
+                    context=IngestionContext.preload(),
+                    force=options["force_update"],
+                )
+            logger.info("Items : Created %i, Updated %i", created_count, updated_count)
+
+            logger.info("Published catalog version %i", CatalogVersion.bump())
+            transaction.on_commit(forget_catalog_version)
+            if manifest_version:
+                ManifestVersion.objects.update_or_create(
+                    version=manifest_version.pop("version"),
+                    defaults={**manifest_version, "imported_at": timezone.now()},
+                )
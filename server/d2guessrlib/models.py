@@ -1,12 +1,13 @@
 from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelation
 from django.contrib.contenttypes.models import ContentType
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 
 # Generic models that are translated using ContentTranslation
 class DamageType(models.Model):
-    id_bungie = models.BigIntegerField()
+    id_bungie = models.BigIntegerField(unique=True)
     name = models.CharField(max_length=50, unique=True)
     desc = models.TextField()
     icon_url = models.URLField(blank=True, null=True)
@@ -20,7 +21,7 @@ class DamageType(models.Model):
 
 
 class Category(models.Model):
-    id_bungie = models.BigIntegerField()
+    id_bungie = models.BigIntegerField(unique=True)
     name = models.CharField(max_length=50, unique=True)
     desc = models.TextField()
     icon_url = models.URLField(blank=True, null=True)
@@ -36,7 +37,7 @@ class Category(models.Model):
 
 
 class TierType(models.Model):
-    id_bungie = models.BigIntegerField()
+    id_bungie = models.BigIntegerField(unique=True)
     name = models.CharField(max_length=50, unique=True)
     translations = GenericRelation("ContentTranslation")
 
@@ -50,7 +51,7 @@ class TierType(models.Model):
 
 
 class ClassType(models.Model):
-    id_bungie = models.BigIntegerField()
+    id_bungie = models.BigIntegerField(unique=True)
     name = models.CharField(max_length=50, unique=True)
     translations = GenericRelation("ContentTranslation")
 
@@ -114,6 +115,7 @@ class Perk(models.Model):
     desc = models.TextField()
     icon_url = models.URLField(blank=True, null=True)
     is_intrinsic = models.BooleanField(default=False)
+    fingerprint = models.CharField(max_length=64, blank=True, default="")
     translations = GenericRelation("ContentTranslation")
 
     def __str__(self):
@@ -228,6 +230,9 @@ class Item(models.Model):
     stat_group_hash = models.BigIntegerField(null=True)
     season = models.ForeignKey(Season, on_delete=models.SET_NULL, null=True)
     perks = models.ManyToManyField(Perk, related_name="items")
+    fingerprint = models.CharField(max_length=64, blank=True, default="")
+    # Items gone from the manifest stay in the collections of the accounts owning them, out of the catalog
+    is_active = models.BooleanField(default=True)
 
     class Meta:
         ordering = ["api_name"]
@@ -277,3 +282,122 @@ class ItemTranslation(models.Model):
 
     def __str__(self):
         return f"{self.name}"
+
+
+class ItemHashAlias(models.Model):
+    """
+    Hash of a definition of an item (reissue, variant or the imported definition itself), mapped to the Item
+    imported for all the definitions sharing its name.
+    """
+
+    hash = models.BigIntegerField(unique=True)
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name="hash_aliases")
+
+    def __str__(self):
+        return f"ItemHashAlias({self.hash} -> {self.item_id})"
+
+
+class ManifestVersion(models.Model):
+    version = models.CharField(max_length=100, unique=True)
+    content_paths = models.JSONField(default=dict)
+    checksums = models.JSONField(default=dict)
+    etag = models.CharField(max_length=255, blank=True, default="")
+    last_modified = models.CharField(max_length=64, blank=True, default="")
+    imported_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ("-imported_at",)
+
+    def __str__(self):
+        return f"Manifest({self.version})"
+
+    @classmethod
+    def latest_imported(cls):
+        return cls.objects.filter(imported_at__isnull=False).order_by("-imported_at").first()
+
+    def conditional_headers(self):
+        """
+        Headers making the manifest request answer 304 if the manifest did not change since this version.
+        """
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class IngestionRun(models.Model):
+    class Status(models.TextChoices):
+        RUNNING = "running", _("Running")
+        SUCCEEDED = "succeeded", _("Succeeded")
+        SKIPPED = "skipped", _("Skipped")
+        FAILED = "failed", _("Failed")
+
+    started_at = models.DateTimeField(default=timezone.now)
+    seconds = models.FloatField(null=True, blank=True)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.RUNNING)
+    manifest_version = models.CharField(max_length=100, blank=True, default="")
+    options = models.JSONField(default=dict)
+    phases = models.JSONField(default=list)
+    critical_path = models.JSONField(default=list)
+
+    class Meta:
+        ordering = ("-started_at",)
+
+    def __str__(self):
+        return f"IngestionRun({self.started_at:%Y-%m-%d %H:%M}, {self.status})"
+
+
+class StagedRecord(models.Model):
+    run = models.ForeignKey(IngestionRun, on_delete=models.CASCADE, related_name="staged_records")
+    kind = models.CharField(max_length=20)
+    key = models.BigIntegerField()
+    payload = models.JSONField()
+
+    class Meta:
+        unique_together = ("run", "kind", "key")
+
+    def __str__(self):
+        return f"StagedRecord({self.kind} {self.key})"
+
+
+class IngestionCheckpoint(models.Model):
+    manifest_version = models.CharField(max_length=100)
+    stage = models.CharField(max_length=20)
+    run = models.ForeignKey(IngestionRun, on_delete=models.CASCADE, related_name="checkpoints")
+    batch = models.PositiveIntegerField(default=0)
+    payload = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("manifest_version", "stage")
+
+    def __str__(self):
+        return f"IngestionCheckpoint({self.manifest_version}, {self.stage} #{self.batch})"
+
+
+class CatalogVersion(models.Model):
+    """
+    Version of the published catalog, bumped by every import. Cached API responses are keyed by it.
+    """
+
+    version = models.PositiveIntegerField(default=0)
+    published_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"CatalogVersion({self.version})"
+
+    @classmethod
+    def current(cls):
+        return cls.objects.values_list("version", flat=True).first() or 0
+
+    @classmethod
+    def bump(cls):
+        """
+        Increment the catalog version. Called inside the transaction publishing the catalog, so the new
+        version becomes visible together with the new data.
+        """
+        catalog_version, _ = cls.objects.get_or_create(pk=1)
+        cls.objects.filter(pk=catalog_version.pk).update(version=models.F("version") + 1, published_at=timezone.now())
+        return cls.current()
@@ -3,13 +3,13 @@ import logging
 from django.conf import settings
 from django.db.models import Prefetch
 from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import viewsets
 from rest_framework.filters import OrderingFilter, SearchFilter
 from rest_framework.response import Response
 
+from d2guessrlib.cache import catalog_cache_page
 from d2guessrlib.filters import ItemFilterSet
 from d2guessrlib.models import Category, ClassType, DamageType, Item, ItemTranslation, StatType, TierType
 from d2guessrlib.paginations import ItemPagination
@@ -43,7 +43,7 @@ class CachedReadOnlyViewSet(viewsets.ReadOnlyModelViewSet):
             responses={200: "List of objects"},
         ),
     )
-    @method_decorator(cache_page(settings.CACHE_TTL), name="list")
+    @method_decorator(catalog_cache_page(settings.CACHE_TTL), name="list")
     def list(self, request, *args, **kwargs):
         logger.info(f"Fetched {self.__class__.__name__} list view")
         return super().list(request, *args, **kwargs)
@@ -55,7 +55,7 @@ class CachedReadOnlyViewSet(viewsets.ReadOnlyModelViewSet):
             responses={200: "Object details", 404: "Not found"},
         ),
     )
-    @method_decorator(cache_page(settings.CACHE_TTL), name="retrieve")
+    @method_decorator(catalog_cache_page(settings.CACHE_TTL), name="retrieve")
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
         serializer = self.get_serializer(instance)
@@ -79,7 +79,7 @@ class ItemViewSet(CachedReadOnlyViewSet):
         lang = self.request.query_params.get("lang", "en")
 
         return (
-            Item.objects.all()
+            Item.objects.filter(is_active=True)
             .prefetch_related(
                 Prefetch(
                     "translations",
@@ -0,0 +1,118 @@
+import functools
+import threading
+import zipfile
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from d2guessrlib.management.commands._manifest import download_manifest_database, download_manifest_databases
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    # Paths answering a 503 before being served, with the number of failures left
+    failures = {}
+
+    def do_GET(self):
+        if self.failures.get(self.path):
+            self.failures[self.path] -= 1
+            self.send_error(503)
+            return
+        super().do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def http_root(tmp_path):
+    root = tmp_path / "www"
+    root.mkdir()
+    return root
+
+
+@pytest.fixture
+def http_server(http_root):
+    QuietHandler.failures = {}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(QuietHandler, directory=str(http_root)))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def _zip_manifest(path, content):
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("world_sql_content_abc.content", content)
+
+
+class TestDownloadManifestDatabase:
+    def test_download_and_extract(self, tmp_path, http_root, http_server):
+        content = b"SQLite format 3\x00" + bytes(range(256)) * 4096
+        _zip_manifest(http_root / "en.zip", content)
+        dest_path = tmp_path / "world_sql_en.content"
+
+        download_manifest_database(f"{http_server}/en.zip", str(dest_path), chunk_size=1024)
+
+        assert dest_path.read_bytes() == content
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["world_sql_en.content", "www"]
+
+    def test_failed_download_keeps_previous_file(self, tmp_path, http_server):
+        dest_path = tmp_path / "world_sql_en.content"
+        dest_path.write_bytes(b"previous")
+
+        with pytest.raises(requests.HTTPError):
+            download_manifest_database(f"{http_server}/missing.zip", str(dest_path))
+
+        assert dest_path.read_bytes() == b"previous"
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["world_sql_en.content", "www"]
+
+    def test_bad_zip(self, tmp_path, http_root, http_server):
+        (http_root / "en.zip").write_bytes(b"not a zip")
+        dest_path = tmp_path / "world_sql_en.content"
+
+        with pytest.raises(zipfile.BadZipFile):
+            download_manifest_database(f"{http_server}/en.zip", str(dest_path))
+
+        assert not dest_path.exists()
+
+
+class TestDownloadManifestDatabases:
+    def test_download_every_language(self, tmp_path, http_root, http_server):
+        for lang in ("en", "fr", "de"):
+            _zip_manifest(http_root / f"{lang}.zip", lang.encode() * 1000)
+
+        paths = download_manifest_databases(
+            {lang: f"{http_server}/{lang}.zip" for lang in ("en", "fr", "de")}, dest_dir=str(tmp_path), max_workers=2
+        )
+
+        assert sorted(paths) == ["de", "en", "fr"]
+        for lang, path in paths.items():
+            assert path == str(tmp_path / f"world_sql_{lang}.content")
+            assert (tmp_path / f"world_sql_{lang}.content").read_bytes() == lang.encode() * 1000
+
+    def test_retry(self, tmp_path, http_root, http_server):
+        _zip_manifest(http_root / "en.zip", b"content")
+        QuietHandler.failures["/en.zip"] = 2
+
+        paths = download_manifest_databases(
+            {"en": f"{http_server}/en.zip"}, dest_dir=str(tmp_path), retries=3, retry_delay=0
+        )
+
+        assert (tmp_path / "world_sql_en.content").read_bytes() == b"content"
+        assert paths == {"en": str(tmp_path / "world_sql_en.content")}
+
+    def test_failure_is_raised_and_leaves_no_partial_file(self, tmp_path, http_root, http_server):
+        _zip_manifest(http_root / "en.zip", b"content")
+
+        with pytest.raises(requests.HTTPError):
+            download_manifest_databases(
+                {"en": f"{http_server}/en.zip", "fr": f"{http_server}/missing.zip"},
+                dest_dir=str(tmp_path),
+                retries=2,
+                retry_delay=0,
+            )
+
+        assert not (tmp_path / "world_sql_fr.content").exists()
+        assert not [p.name for p in tmp_path.iterdir() if p.name.endswith((".part", ".zip"))]
@@ -7,9 +7,9 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from social_core.exceptions import AuthConnectionError
 
 from d2guessrauth.bungie.oauth_client import BungieClient
-from d2guessrauth.bungie.pipeline import DisconnectionError, disconnect_bungie_account
+from d2guessrauth.bungie.pipeline import DisconnectionError, _add_items_to_account, disconnect_bungie_account
 from d2guessrauth.models import BungieAccount, BungieUser
-from d2guessrlib.models import Item
+from d2guessrlib.models import Item, ItemHashAlias
 from mockups.bungie_mockup import load_json_from_file
 
 
@@ -34,6 +34,7 @@ class TestBungieOAuthPipeline:
             )
             item.save()
             item.damage_types.add(damage_type)
+            ItemHashAlias.objects.create(hash=i, item=item)
 
     def _authenticate_one_account_user(self, client: APIClient):
         redirect = client.post(reverse("social:begin", args=("bungie",)), follow=False)
@@ -191,6 +192,22 @@ class TestBungieOAuthPipeline:
         bungie_account.refresh_from_db()
         assert bungie_account.account_display_name == "fakeDisplayName"  # back to its original name
 
+    def test_add_items_resolves_variant_hashes(self, user: User):
+        bungie_user = BungieUser.objects.create(user=user, bungie_membership_id=1)
+        bungie_account = BungieAccount.objects.create(
+            bungie_user=bungie_user, destiny_membership_id=100, membership_type=6
+        )
+        item = Item.objects.get(id_bungie=1)
+        ItemHashAlias.objects.create(hash=1001, item=item)
+
+        added_count = _add_items_to_account(
+            inventory_set_data=[{"itemHash": 1001}, {"itemHash": 1}, {"itemHash": 2}, {"itemHash": 404}],
+            bungie_account=bungie_account,
+        )
+
+        assert added_count == 2
+        assert set(bungie_account.items.values_list("id_bungie", flat=True)) == {1, 2}
+
     def test_bungie_account_items_view(
         self,
         client: APIClient,
@@ -0,0 +1,974 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import tracemalloc
+
+import mock
+import pytest
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from d2guessrauth.models import BungieAccount, BungieUser
+from d2guessrlib.management.commands._bulk import BulkWriter, CopyStream, PostgresCopyWriter, bulk_writer, copy_line
+from d2guessrlib.management.commands._manifest import ManifestReader, ManifestSet, file_checksum, signed_hash
+from d2guessrlib.management.commands._populate_tools import (
+    IngestionContext,
+    TranslationIndex,
+    create_or_update_categories,
+    create_or_update_classes,
+    create_or_update_damage_types,
+    create_or_update_items,
+    create_or_update_stat_types,
+    create_or_update_tier_types,
+    load_item_translations,
+    load_table,
+)
+from d2guessrlib.management.commands._REFS import STATS_HM, classify_item, classify_items
+from d2guessrlib.management.commands._scheduler import StageScheduler
+from d2guessrlib.management.commands._snapshot import SNAPSHOT_MODELS
+from d2guessrlib.management.commands._staging import stage_items as _stage_items
+from d2guessrlib.management.commands._synthetic import SyntheticManifest
+from d2guessrlib.management.commands._transform import transform_items
+from d2guessrlib.management.commands.benchmark_populate_db import run_benchmark
+from d2guessrlib.models import (
+    CatalogVersion,
+    Category,
+    ClassType,
+    ContentTranslation,
+    DamageType,
+    IngestionCheckpoint,
+    IngestionRun,
+    Item,
+    ItemHashAlias,
+    ItemStat,
+    ItemTranslation,
+    ManifestVersion,
+    Perk,
+    StagedRecord,
+    StatType,
+    TierType,
+)
+
+KINETIC_HASH = 3373582085
+SOLAR_HASH = 1847026933
+LEGENDARY_HASH = 4008398120
+EXOTIC_HASH = 2759499571
+RPM_HASH = 4284893193
+IMPACT_HASH = 4043523819
+FRAME_HASH = 1000
+EXOTIC_FRAME_HASH = 1001
+
+
+def _display(name, description="", icon="/icon.png"):
+    return {"displayProperties": {"name": name, "description": description, "icon": icon}}
+
+
+def _weapon(hash_id, name, tier_type, tier_type_hash, frame_hash, lang):
+    return {
+        "hash": hash_id,
+        **_display(f"{name} ({lang})"),
+        "screenshot": "/screenshot.png",
+        "flavorText": f"Flavor {lang}",
+        "itemType": 3,
+        "classType": 3,
+        "defaultDamageTypeHash": KINETIC_HASH,
+        "damageTypeHashes": [KINETIC_HASH, SOLAR_HASH],
+        "itemCategoryHashes": [1, 2, 5],
+        "equippingBlock": {"ammoType": 1},
+        "inventory": {"tierType": tier_type, "tierTypeHash": tier_type_hash},
+        "stats": {
+            "statGroupHash": 1,
+            "stats": {str(RPM_HASH): {"value": 600}, str(IMPACT_HASH): {"value": 30}, "1": {"value": 5}},
+        },
+        "sockets": {"socketEntries": [{"singleInitialItemHash": frame_hash}, {"singleInitialItemHash": 0}]},
+    }
+
+
+def manifest_tables(lang):
+    return {
+        "DestinyDamageTypeDefinition": [
+            {"hash": KINETIC_HASH, **_display(f"Kinetic ({lang})")},
+            {"hash": SOLAR_HASH, **_display(f"Solar ({lang})")},
+        ],
+        "DestinyItemTierTypeDefinition": [
+            {"hash": LEGENDARY_HASH, **_display(f"Legendary ({lang})")},
+            {"hash": EXOTIC_HASH, **_display(f"Exotic ({lang})")},
+        ],
+        "DestinyItemCategoryDefinition": [
+            {"hash": 5, **_display(f"Auto Rifle ({lang})")},
+            {"hash": 21, **_display(f"Warlock ({lang})")},
+        ],
+        "DestinyStatDefinition": [
+            {"hash": RPM_HASH, **_display(f"Rounds Per Minute ({lang})", "Fire rate")},
+            {"hash": IMPACT_HASH, **_display(f"Impact ({lang})", "Damage")},
+        ],
+        "DestinyInventoryItemDefinition": [
+            _weapon(10, "Legendary Auto", 5, LEGENDARY_HASH, FRAME_HASH, lang),
+            _weapon(3000000000, "Exotic Auto", 6, EXOTIC_HASH, EXOTIC_FRAME_HASH, lang),
+            {"hash": FRAME_HASH, "itemTypeDisplayName": "Intrinsic", **_display(f"Frame ({lang})", "Frame desc")},
+            {"hash": EXOTIC_FRAME_HASH, "itemTypeDisplayName": "Intrinsic", **_display(f"Exotic Frame ({lang})")},
+        ],
+    }
+
+
+def write_manifest(path, lang):
+    with sqlite3.connect(path) as connection:
+        for table_name, rows in manifest_tables(lang).items():
+            connection.execute(f"CREATE TABLE {table_name} (id INTEGER PRIMARY KEY NOT NULL, json BLOB)")
+            connection.executemany(
+                f"INSERT INTO {table_name} (id, json) VALUES (?, ?)",
+                [(signed_hash(row["hash"]), json.dumps(row)) for row in rows],
+            )
+    connection.close()
+
+
+@pytest.fixture
+def manifest_path(tmp_path):
+    for lang in ("en", "fr"):
+        write_manifest(tmp_path / f"world_sql_{lang}.content", lang)
+    return tmp_path
+
+
+def assert_populated():
+    """
+    Check the catalog imported from the manifest of the `manifest_path` fixture.
+    """
+    assert DamageType.objects.count() == 2
+    assert TierType.objects.count() == 2
+    assert Category.objects.count() == 1
+    assert ClassType.objects.count() == 1
+    assert StatType.objects.count() == 2
+
+    legendary = Item.objects.get(id_bungie=10)
+    assert legendary.api_name == "Legendary Auto (en)"
+    assert legendary.tier_type.id_bungie == LEGENDARY_HASH
+    assert legendary.category.id_bungie == 5
+    assert legendary.weapon_slot == 2
+    assert set(legendary.damage_types.values_list("id_bungie", flat=True)) == {KINETIC_HASH, SOLAR_HASH}
+    assert list(legendary.perks.values_list("id_bungie", flat=True)) == [FRAME_HASH]
+    assert dict(legendary.stats.values_list("stat_type__id_bungie", "value")) == {RPM_HASH: 600, IMPACT_HASH: 30}
+    assert legendary.translations.get(language="fr").name == "Legendary Auto (fr)"
+
+    exotic = Item.objects.get(id_bungie=3000000000)
+    assert exotic.tier_type.id_bungie == EXOTIC_HASH
+
+    perk = Perk.objects.get(id_bungie=FRAME_HASH)
+    assert perk.is_intrinsic
+    assert perk.translations.get(language="fr", field_name="name").text == "Frame (fr)"
+
+    stat_type = StatType.objects.get(id_bungie=RPM_HASH)
+    assert stat_type.translations.get(language="fr", field_name="desc").text == "Fire rate"
+
+
+@pytest.mark.django_db
+class TestPopulateDb:
+    def test_populate_db(self, manifest_path):
+        call_command("populate_db", use_local=True, local_path=str(manifest_path))
+
+        assert_populated()
+
+    @pytest.mark.skipif(connection.vendor != "postgresql", reason="Run by the Postgres job of the CI")
+    def test_populate_db_on_postgres(self, manifest_path):
+        assert isinstance(bulk_writer(), PostgresCopyWriter)
+
+        with (
+            CaptureQueriesContext(connection) as queries,
+            mock.patch.object(CopyStream, "read", autospec=True, side_effect=CopyStream.read) as read,
+        ):
+            call_command("populate_db", use_local=True, local_path=str(manifest_path))
+
+        # Rows are read by psycopg2 from text streams into temporary tables, then merged
+        assert read.called
+        statements = [query["sql"] for query in queries.captured_queries]
+        assert any("CREATE TEMPORARY TABLE" in sql for sql in statements)
+        assert any(sql.startswith("INSERT") and "ON CONFLICT" in sql and "DO UPDATE" in sql for sql in statements)
+        assert any(sql.startswith("DELETE") and "= ANY(" in sql for sql in statements)
+        assert_populated()
+
+    def test_item_variants_are_aliased(self, manifest_path):
+        for lang in ("en", "fr"):
+            with sqlite3.connect(manifest_path / f"world_sql_{lang}.content") as manifest:
+                variant = _weapon(11, "Legendary Auto", 5, LEGENDARY_HASH, FRAME_HASH, lang)
+                manifest.execute(
+                    "INSERT INTO DestinyInventoryItemDefinition (id, json) VALUES (?, ?)",
+                    (signed_hash(11), json.dumps(variant)),
+                )
+            manifest.close()
+
+        call_command("populate_db", use_local=True, local_path=str(manifest_path))
+
+        legendary = Item.objects.get(api_name="Legendary Auto (en)")
+        assert set(legendary.hash_aliases.values_list("hash", flat=True)) == {10, 11}
+        assert set(ItemHashAlias.objects.values_list("hash", flat=True)) == {10, 11, 3000000000}
+
+    def test_phases_are_recorded(self, manifest_path, tmp_path):
+        report_path = tmp_path / "report.json"
+
+        call_command("populate_db", use_local=True, local_path=str(manifest_path), report=str(report_path))
+
+        run = IngestionRun.objects.get()
+        assert run.status == IngestionRun.Status.SUCCEEDED
+        assert run.options["use_local"]
+        phases = {phase["name"]: phase for phase in run.phases}
+        assert set(phases) == {
+            "stage_items",
+            "damage_types",
+            "tier_types",
+            "categories",
+            "classes",
+            "stat_types",
+            "lookups",
+            "items",
+            "translations",
+        }
+        # Lookups are written by the publish stage, after every stage it requires
+        assert phases["lookups"]["rows_by_model"]["DamageType"] == 2
+        assert phases["lookups"]["started"] >= max(phases[name]["started"] for name in ("stage_items", "stat_types"))
+        assert run.critical_path[-1] == "publish"
+        assert phases["items"]["rows_by_model"]["ItemStat"] == 4
+        assert phases["items"]["queries"] > 0
+        assert phases["items"]["max_rss"] > 0
+        # Memory is only traced on demand
+        assert phases["items"]["peak_memory"] is None
+        assert phases["translations"]["nested"]
+        assert phases["translations"]["rows_by_model"]["ItemTranslation"] == 2
+
+        report = json.loads(report_path.read_text())
+        assert report["status"] == "succeeded"
+        assert report["phases"] == run.phases
+        assert report["critical_path"] == run.critical_path
+        assert {stage["name"] for stage in report["stages"]} == {*phases, "publish"} - {
+            "lookups",
+            "items",
+            "translations",
+        }
+
+    def test_trace_memory(self, manifest_path):
+        call_command("populate_db", use_local=True, local_path=str(manifest_path), trace_memory=True)
+
+        phases = {phase["name"]: phase for phase in IngestionRun.objects.get().phases}
+        assert phases["items"]["peak_memory"] > 0
+        assert not tracemalloc.is_tracing()
+
+    def test_english_manifest_is_closed_on_failure(self, manifest_path):
+        open_reader = ManifestReader.open
+        opened = {}
+
+        def open_manifest(path, **kwargs):
+            reader = open_reader(path, **kwargs)
+            # English is first opened by the command itself
+            opened.setdefault(os.path.basename(path), reader)
+            return reader
+
+        with (
+            mock.patch("d2guessrlib.management.commands.populate_db.write_items", side_effect=RuntimeError),
+            mock.patch.object(ManifestReader, "open", side_effect=open_manifest),
+            pytest.raises(RuntimeError),
+        ):
+            call_command("populate_db", use_local=True, local_path=str(manifest_path))
+
+        with pytest.raises(sqlite3.ProgrammingError):
+            opened["world_sql_en.content"].cursor()
+
+    def test_catalog_is_published_at_once(self, manifest_path):
+        with (
+            mock.patch("d2guessrlib.management.commands.populate_db.write_items", side_effect=RuntimeError),
+            pytest.raises(RuntimeError),
+        ):
+            call_command("populate_db", use_local=True, local_path=str(manifest_path))
+
+        # Lookups written before the failure were rolled back with it, staged items were kept
+        assert not DamageType.objects.exists()
+        assert not Item.objects.exists()
+        run = IngestionRun.objects.get()
+        assert run.status == IngestionRun.Status.FAILED
+        assert sorted(run.staged_records.values_list("kind", flat=True)) == ["item", "item", "plug", "plug"]
+        assert CatalogVersion.current() == 0
+
+        call_command("populate_db", use_local=True, local_path=str(manifest_path))
+
+        assert Item.objects.count() == 2
+        assert CatalogVersion.current() == 1
+        assert not StagedRecord.objects.exclude(run=run).exists()
+
+    def test_resume_after_staged_batch(self, manifest_path):
+        staged_batches = []
+
+        def stage_items(run, item_records, plug_defs, writer):
+            if staged_batches:
+                raise RuntimeError
+            staged_batches.append([record["hash"] for record in item_records])
+            _stage_items(run, item_records, plug_defs, writer)
+
+        with (
+            mock.patch("d2guessrlib.management.commands.populate_db.stage_items", side_effect=stage_items),
+            pytest.raises(RuntimeError),
+        ):
+            call_command("populate_db", use_local=True, local_path=str(manifest_path), batch_size=1)
+        assert IngestionCheckpoint.objects.get(stage="stage_items").batch == 1
+
+        with mock.patch(
+            "d2guessrlib.management.commands.populate_db.stage_items", side_effect=_stage_items
+        ) as resumed_stage_items:
+            call_command("populate_db", use_local=True, local_path=str(manifest_path), batch_size=1, resume=True)
+
+        # Only the item that was not staged yet is read again
+        assert resumed_stage_items.call_count == 1
+        assert [record["hash"] for record in resumed_stage_items.call_args.args[1]] != staged_batches[0]
+        assert Item.objects.count() == 2
+        assert not IngestionCheckpoint.objects.exists()
+        assert not StagedRecord.objects.exists()
+
+    def test_records_of_other_versions_are_cleared(self, manifest_path):
+        with (
+            mock.patch("d2guessrlib.management.commands.populate_db.write_items", side_effect=RuntimeError),
+            pytest.raises(RuntimeError),
+        ):
+            call_command("populate_db", use_local=True, local_path=str(manifest_path))
+        en_path = manifest_path / "world_sql_en.content"
+        assert set(IngestionCheckpoint.objects.values_list("manifest_version", flat=True)) == {
+            f"local-{file_checksum(en_path)[:32]}"
+        }
+        # A run that failed before its first checkpoint
+        unsaved_run = IngestionRun.objects.create(status=IngestionRun.Status.FAILED)
+        StagedRecord.objects.create(run=unsaved_run, kind="item", key=10, payload={})
+
+        with sqlite3.connect(en_path) as manifest:
+            manifest.execute("CREATE TABLE DestinyNewDefinition (id INTEGER PRIMARY KEY NOT NULL, json BLOB)")
+        manifest.close()
+        call_command("populate_db", use_local=True, local_path=str(manifest_path), resume=True)
+
+        assert Item.objects.count() == 2
+        assert not IngestionCheckpoint.objects.exists()
+        assert not StagedRecord.objects.exists()
+
+    def test_all_languages(self, manifest_path):
+        write_manifest(manifest_path / "world_sql_de.content", "de")
+
+        call_command(
+            "populate_db", use_local=True, local_path=str(manifest_path), languages=["all"], max_open_manifests=1
+        )
+
+        legendary = Item.objects.get(id_bungie=10)
+        assert dict(legendary.translations.values_list("language", "name")) == {
+            "de": "Legendary Auto (de)",
+            "fr": "Legendary Auto (fr)",
+        }
+        perk = Perk.objects.get(id_bungie=FRAME_HASH)
+        assert perk.translations.get(language="de", field_name="name").text == "Frame (de)"
+        assert DamageType.objects.get(id_bungie=KINETIC_HASH).translations.filter(language="de").exists()
+
+    def test_translations_only(self, manifest_path, tmp_path_factory):
+        call_command("populate_db", use_local=True, local_path=str(manifest_path))
+        # Only the database of the new language is needed
+        de_path = tmp_path_factory.mktemp("de")
+        write_manifest(de_path / "world_sql_de.content", "de")
+
+        with CaptureQueriesContext(connection) as queries:
+            call_command(
+                "populate_db", use_local=True, local_path=str(de_path), languages=["de"], translations_only=True
+            )
+
+        assert IngestionRun.objects.first().status == IngestionRun.Status.SUCCEEDED
+        writes = [query["sql"] for query in queries.captured_queries if query["sql"].startswith(("INSERT", "UPDATE"))]
+        written_tables = {sql.split('"')[1] for sql in writes}
+        assert written_tables == {
+            "d2guessrlib_contenttranslation",
+            "d2guessrlib_itemtranslation",
+            "d2guessrlib_catalogversion",
+            "d2guessrlib_ingestionrun",
+        }
+        legendary = Item.objects.get(id_bungie=10)
+        assert legendary.translations.get(language="de").name == "Legendary Auto (de)"
+        assert legendary.translations.get(language="fr").name == "Legendary Auto (fr)"
+        assert Perk.objects.get(id_bungie=FRAME_HASH).translations.get(language="de", field_name="name").text == (
+            "Frame (de)"
+        )
+        assert StatType.objects.get(id_bungie=RPM_HASH).translations.get(language="de", field_name="name").text == (
+            "Rounds Per Minute (de)"
+        )
+        assert CatalogVersion.current() == 2
+
+    def test_populate_db_is_idempotent(self, manifest_path):
+        call_command("populate_db", use_local=True, local_path=str(manifest_path))
+        call_command("populate_db", use_local=True, local_path=str(manifest_path))
+
+        assert Item.objects.count() == 2
+        assert ItemStat.objects.count() == 4
+        assert ItemTranslation.objects.count() == 2
+        assert Perk.objects.count() == 2
+        assert Item.perks.through.objects.count() == 2
+        assert Item.damage_types.through.objects.count() == 4
+        content_type = ContentType.objects.get_for_model(DamageType)
+        assert ContentTranslation.objects.filter(content_type=content_type).count() == 2
+
+    def test_unchanged_items_are_not_written_again(self, manifest_path):
+        call_command("populate_db", use_local=True, local_path=str(manifest_path))
+        fingerprints = dict(Item.objects.values_list("id_bungie", "fingerprint"))
+
+        with CaptureQueriesContext(connection) as queries:
+            call_command("populate_db", use_local=True, local_path=str(manifest_path))
+
+        item_tables = [model._meta.db_table for model in (Item, ItemStat, ItemTranslation, Perk)]
+        writes = [
+            query["sql"]
+            for query in queries.captured_queries
+            if query["sql"].startswith(("INSERT", "UPDATE", "DELETE"))
+            and any(f'"{table}"' in query["sql"].split(" (")[0] for table in item_tables)
+        ]
+        assert writes == []
+        assert dict(Item.objects.values_list("id_bungie", "fingerprint")) == fingerprints
+
+    def test_new_items_get_their_fingerprint_last(self, manifest_path):
+        written = []
+        replace_m2m = BulkWriter.replace_m2m
+
+        def snapshot_fingerprints(writer, relation, links):
+            written.append({model: set(model.objects.values_list("fingerprint", flat=True)) for model in (Item, Perk)})
+            return replace_m2m(writer, relation, links)
+
+        with mock.patch.object(BulkWriter, "replace_m2m", snapshot_fingerprints):
+            call_command("populate_db", use_local=True, local_path=str(manifest_path))
+
+        # An import interrupted before the fingerprints are written leaves new rows to be written again
+        assert written[0] == {Item: {""}, Perk: {""}}
+        assert "" not in set(Item.objects.values_list("fingerprint", flat=True))
+        assert "" not in set(Perk.objects.values_list("fingerprint", flat=True))
+
+    def test_changed_and_removed_items(self, manifest_path):
+        call_command("populate_db", use_local=True, local_path=str(manifest_path))
+        unchanged_fingerprint = Item.objects.get(id_bungie=10).fingerprint
+
+        with sqlite3.connect(manifest_path / "world_sql_en.content") as manifest:
+            exotic = _weapon(3000000000, "Exotic Auto", 6, EXOTIC_HASH, EXOTIC_FRAME_HASH, "en")
+            exotic["stats"]["stats"] = {str(RPM_HASH): {"value": 450}}
+            manifest.execute(
+                "UPDATE DestinyInventoryItemDefinition SET json = ? WHERE id = ?",
+                (json.dumps(exotic), signed_hash(3000000000)),
+            )
+            manifest.execute("DELETE FROM DestinyInventoryItemDefinition WHERE id = 10")
+        manifest.close()
+        call_command("populate_db", use_local=True, local_path=str(manifest_path))
+
+        exotic = Item.objects.get(id_bungie=3000000000)
+        assert dict(exotic.stats.values_list("stat_type__id_bungie", "value")) == {RPM_HASH: 450}
+        assert exotic.fingerprint != unchanged_fingerprint
+        assert not Item.objects.filter(id_bungie=10).exists()
+        assert ItemTranslation.objects.count() == 1
+
+    def test_removed_items_owned_by_accounts_are_deactivated(self, manifest_path, user):
+        call_command("populate_db", use_local=True, local_path=str(manifest_path))
+        bungie_user = BungieUser.objects.create(user=user, bungie_membership_id=1)
+        bungie_account = BungieAccount.objects.create(
+            bungie_user=bungie_user, destiny_membership_id=100, membership_type=6
+        )
+        bungie_account.items.add(Item.objects.get(id_bungie=10))
+
+        en_path = manifest_path / "world_sql_en.content"
+        original = en_path.read_bytes()
+        with sqlite3.connect(en_path) as manifest:
+            manifest.execute(
+                "DELETE FROM DestinyInventoryItemDefinition WHERE id IN (10, ?)", (signed_hash(3000000000),)
+            )
+        manifest.close()
+        call_command("populate_db", use_local=True, local_path=str(manifest_path))
+
+        # Only the item owned by an account is kept, out of the catalog
+        assert list(Item.objects.values_list("id_bungie", "is_active")) == [(10, False)]
+        assert list(bungie_account.items.values_list("id_bungie", flat=True)) == [10]
+
+        en_path.write_bytes(original)
+        call_command("populate_db", use_local=True, local_path=str(manifest_path))
+
+        assert set(Item.objects.values_list("id_bungie", "is_active")) == {(10, True), (3000000000, True)}
+        assert list(bungie_account.items.values_list("id_bungie", flat=True)) == [10]
+
+    def test_exotic_only(self, manifest_path):
+        call_command("populate_db", use_local=True, local_path=str(manifest_path), exotic_only=True)
+
+        assert list(Item.objects.values_list("id_bungie", flat=True)) == [3000000000]
+
+    def test_localized_items_are_loaded_in_one_query(self, manifest_path):
+        english_cursor = sqlite3.connect(manifest_path / "world_sql_en.content").cursor()
+        localized_connection = sqlite3.connect(manifest_path / "world_sql_fr.content")
+        localized_cursors = {"fr": localized_connection.cursor()}
+        for create_or_update in (
+            create_or_update_damage_types,
+            create_or_update_tier_types,
+            create_or_update_categories,
+            create_or_update_classes,
+            create_or_update_stat_types,
+        ):
+            create_or_update(english_cursor, localized_cursors=localized_cursors)
+
+        statements = []
+        localized_connection.set_trace_callback(statements.append)
+        create_or_update_items(english_cursor, localized_cursors=localized_cursors)
+
+        # One query for the items and one for their intrinsic perks
+        assert len(statements) == 2
+        assert ItemTranslation.objects.count() == 2
+
+    def test_lookups_are_resolved_from_memory(self, manifest_path):
+        english_cursor = sqlite3.connect(manifest_path / "world_sql_en.content").cursor()
+        for create_or_update in (
+            create_or_update_damage_types,
+            create_or_update_tier_types,
+            create_or_update_categories,
+            create_or_update_classes,
+            create_or_update_stat_types,
+        ):
+            create_or_update(english_cursor)
+
+        with CaptureQueriesContext(connection) as queries:
+            create_or_update_items(english_cursor)
+
+        lookup_tables = [model._meta.db_table for model in IngestionContext.LOOKUP_MODELS]
+        lookup_selects = [
+            query["sql"]
+            for query in queries.captured_queries
+            if query["sql"].startswith("SELECT") and any(f'FROM "{table}"' in query["sql"] for table in lookup_tables)
+        ]
+        assert len(lookup_selects) == len(lookup_tables)
+
+
+def _manifest_response(status_code=200, version="1.0"):
+    response = mock.MagicMock(status_code=status_code, headers={"ETag": f'"{version}"'})
+    response.json.return_value = {
+        "Response": {
+            "version": version,
+            "mobileWorldContentPaths": {"en": "/world_sql_en.content.zip", "fr": "/world_sql_fr.content.zip"},
+        }
+    }
+    return response
+
+
+@pytest.mark.django_db
+class TestManifestVersion:
+    @pytest.fixture
+    def bungie(self, manifest_path):
+        with (
+            mock.patch("d2guessrlib.management.commands.populate_db.requests.get") as get,
+            mock.patch("d2guessrlib.management.commands.populate_db.download_manifest_databases") as download,
+        ):
+            download.return_value = {lang: str(manifest_path / f"world_sql_{lang}.content") for lang in ("en", "fr")}
+            yield get, download
+
+    def test_version_is_recorded(self, bungie):
+        get, download = bungie
+        get.return_value = _manifest_response()
+
+        call_command("populate_db")
+
+        manifest_version = ManifestVersion.objects.get()
+        assert manifest_version.version == "1.0"
+        assert manifest_version.etag == '"1.0"'
+        assert manifest_version.content_paths["fr"] == "/world_sql_fr.content.zip"
+        assert sorted(manifest_version.checksums) == ["en", "fr"]
+        assert manifest_version.imported_at is not None
+        assert Item.objects.count() == 2
+        assert get.call_args.kwargs["headers"] == {}
+
+    def test_imported_version_is_skipped(self, bungie):
+        get, download = bungie
+        ManifestVersion.objects.create(version="1.0", etag='"1.0"', imported_at=timezone.now())
+        get.return_value = _manifest_response()
+
+        call_command("populate_db")
+
+        assert get.call_args.kwargs["headers"] == {"If-None-Match": '"1.0"'}
+        download.assert_not_called()
+
+        get.return_value = _manifest_response(status_code=304)
+        call_command("populate_db")
+        download.assert_not_called()
+        assert IngestionRun.objects.filter(status=IngestionRun.Status.SKIPPED).count() == 2
+
+        get.return_value = _manifest_response()
+        call_command("populate_db", force_update=True)
+        download.assert_called_once()
+        assert Item.objects.count() == 2
+
+    def test_unknown_language_fails(self, bungie):
+        get, download = bungie
+        get.return_value = _manifest_response()
+
+        call_command("populate_db", languages=["fr", "xx"])
+
+        download.assert_not_called()
+        assert IngestionRun.objects.get().status == IngestionRun.Status.FAILED
+
+    def test_resume_reuses_download(self, bungie):
+        get, download = bungie
+        get.return_value = _manifest_response()
+
+        with (
+            mock.patch("d2guessrlib.management.commands.populate_db.write_items", side_effect=RuntimeError),
+            pytest.raises(RuntimeError),
+        ):
+            call_command("populate_db")
+        call_command("populate_db", resume=True)
+
+        download.assert_called_once()
+        assert Item.objects.count() == 2
+        assert ManifestVersion.objects.get().imported_at is not None
+
+
+@pytest.mark.django_db
+class TestSyntheticManifest:
+    def test_populate_db(self, tmp_path):
+        manifest = SyntheticManifest(items=50, plugs=5, stats=3, seed=1)
+        paths = manifest.write(tmp_path)
+
+        call_command("populate_db", use_local=True, local_path=str(tmp_path))
+
+        assert sorted(paths) == ["en", "fr"]
+        assert Item.objects.count() == 50
+        assert ItemTranslation.objects.filter(language="fr").count() == 50
+        assert Perk.objects.count() <= 5
+        assert ItemStat.objects.count() == 150
+        assert Item.objects.filter(item_type=1, weapon_slot__isnull=False).exists()
+        assert Item.objects.filter(item_type=20, class_type__isnull=False).exists()
+
+    def test_same_seed_same_manifest(self):
+        assert SyntheticManifest(items=10, seed=3).definitions("en") == SyntheticManifest(items=10, seed=3).definitions(
+            "en"
+        )
+
+    def test_transform_workers(self):
+        definitions = SyntheticManifest(items=20, plugs=2, languages=("en", "fr")).definitions
+        fr_translations = {
+            row["hash"]: (row["displayProperties"]["name"], row.get("flavorText"))
+            for row in definitions("fr")["DestinyInventoryItemDefinition"]
+        }
+        rows = [
+            (json.dumps(row), [fr_translations[row["hash"]]])
+            for row in definitions("en")["DestinyInventoryItemDefinition"]
+            if "inventory" in row
+        ]
+
+        records = list(transform_items(rows, workers=2, chunk_size=3))
+
+        assert records == list(transform_items(rows, workers=1))
+        assert [record["hash"] for record in records] == [json.loads(row[0])["hash"] for row in rows]
+        assert records[0]["translations"][0][0].endswith("(fr)")
+
+    def test_run_benchmark(self):
+        results = run_benchmark([10, 20], plugs_ratio=0.5)
+
+        assert [(result["items"], result["plugs"]) for result in results] == [(10, 5), (20, 10)]
+        assert all(result["queries"] > 0 and result["peak_memory"] > 0 for result in results)
+        assert Item.objects.count() == 20
+
+
+@pytest.mark.django_db
+class TestIngestionContext:
+    def test_get(self, damage_type, tier_type):
+        context = IngestionContext.preload()
+
+        assert context.get(DamageType, 1) == damage_type
+        assert context.get(TierType, "1") == tier_type
+        assert context.filter(DamageType, [1, 2]) == [damage_type]
+        with pytest.raises(DamageType.DoesNotExist):
+            context.get(DamageType, 2)
+        with pytest.raises(Category.DoesNotExist):
+            context.get(Category, None)
+
+
+@pytest.mark.django_db
+class TestBulkWriter:
+    def test_upsert_updates_conflicting_rows(self):
+        writer = BulkWriter(batch_size=1)
+        writer.upsert(
+            TierType,
+            [TierType(id_bungie=1, name="Common"), TierType(id_bungie=2, name="Rare")],
+            unique_fields=["id_bungie"],
+            update_fields=["name"],
+        )
+        writer.upsert(
+            TierType, [TierType(id_bungie=1, name="Basic")], unique_fields=["id_bungie"], update_fields=["name"]
+        )
+
+        assert dict(TierType.objects.values_list("id_bungie", "name")) == {1: "Basic", 2: "Rare"}
+        assert writer.stats["TierType"].rows == 3
+
+    def test_replace_m2m(self, item, perk):
+        other_perk = Perk.objects.create(name="other", desc="other", id_bungie=2)
+        writer = BulkWriter()
+
+        writer.replace_m2m(Item.perks, {item.pk: [other_perk.pk]})
+
+        assert list(item.perks.all()) == [other_perk]
+        assert writer.stats["Item_perks"].rows == 1
+
+    def test_bulk_writer_falls_back_on_sqlite(self):
+        writer = bulk_writer(batch_size=10)
+
+        assert type(writer) is BulkWriter
+        assert writer.batch_size == 10
+
+    def test_copy_rows_resolve_objects_saved_after_them(self):
+        class CopyCursor:
+            def __init__(self):
+                self.copied = []
+
+            def execute(self, sql, params=None):
+                pass
+
+            def copy_expert(self, sql, stream):
+                self.copied.append(stream.read())
+
+        item = Item(api_name="item")
+        stat = ItemStat(item=item, stat_type=StatType(pk=7), value=30)
+        translation = ItemTranslation(item=item, language="fr", name="objet", flavor_text=None)
+        item.pk = 42
+        writer = PostgresCopyWriter(connection=connection)
+        cursor = CopyCursor()
+
+        writer._copy_to_temp_table(cursor, ItemStat, writer._columns(ItemStat), [stat])
+        writer._copy_to_temp_table(cursor, ItemTranslation, writer._columns(ItemTranslation), [translation])
+
+        assert cursor.copied == ["42\t7\t30\n", "42\tfr\tobjet\t\\N\n"]
+
+    def test_copy_line_escapes_text_format(self):
+        assert copy_line([1, None, True, "a\tb\nc\\d"]) == "1\t\\N\tt\ta\\tb\\nc\\\\d\n"
+
+    def test_copy_stream_reads_lines_on_demand(self):
+        lines = iter(["ab\n", "cd\n", "ef\n"])
+        stream = CopyStream(lines)
+
+        assert stream.read(4) == "ab\nc"
+        assert next(lines) == "ef\n"
+        assert stream.read() == "d\n"
+
+
+class TestTranslationIndex:
+    def test_load_queries_each_hash_once(self, manifest_path):
+        connection = sqlite3.connect(manifest_path / "world_sql_fr.content")
+        statements = []
+        connection.set_trace_callback(statements.append)
+        index = TranslationIndex({"fr": connection.cursor()})
+
+        index.load("DestinyStatDefinition", hashset=(RPM_HASH, IMPACT_HASH))
+        index.load("DestinyStatDefinition", hashset=(RPM_HASH,))
+        index.load("DestinyStatDefinition", hashset=(IMPACT_HASH, 404))
+
+        assert len(statements) == 2
+        assert index.get("DestinyStatDefinition", "fr", RPM_HASH)["displayProperties"]["name"] == (
+            "Rounds Per Minute (fr)"
+        )
+        assert index.get("DestinyStatDefinition", "fr", 404) == {}
+        connection.close()
+
+
+class TestLoadTable:
+    def test_hashes_are_bound_in_chunks(self, manifest_path):
+        connection = sqlite3.connect(manifest_path / "world_sql_en.content")
+        statements = []
+        connection.set_trace_callback(statements.append)
+        # Thousands of hashes, most of them missing from the table
+        hashset = (10, FRAME_HASH, 3000000000, *range(100000, 102500))
+
+        with mock.patch("d2guessrlib.management.commands._populate_tools.SQLITE_MAX_VARIABLES", 1000):
+            rows = list(load_table(connection.cursor(), "DestinyInventoryItemDefinition", hashset=hashset))
+
+        assert sorted(row["hash"] for row in rows) == [10, FRAME_HASH, 3000000000]
+        assert len(statements) == 3
+        assert all("json_extract" not in statement for statement in statements)
+        (plan,) = connection.execute(
+            "EXPLAIN QUERY PLAN SELECT id, json FROM DestinyInventoryItemDefinition WHERE id IN (?, ?)", (1, 2)
+        ).fetchall()
+        assert "USING INTEGER PRIMARY KEY" in plan[-1]
+        connection.close()
+
+
+class TestManifestReader:
+    def test_get(self, manifest_path):
+        reader = ManifestReader.open(manifest_path / "world_sql_en.content", cache_size=2)
+        statements = []
+        reader.connection.set_trace_callback(statements.append)
+
+        assert reader.get("DestinyInventoryItemDefinition", 3000000000)["hash"] == 3000000000
+        assert reader.get("DestinyInventoryItemDefinition", FRAME_HASH)["itemTypeDisplayName"] == "Intrinsic"
+        assert reader.get("DestinyInventoryItemDefinition", 404) is None
+        assert reader.get("DestinyInventoryItemDefinition", 404) is None
+        assert len(statements) == 3
+
+        # 3000000000 was evicted from the LRU cache
+        reader.get("DestinyInventoryItemDefinition", 3000000000)
+        assert len(statements) == 4
+        reader.close()
+
+    def test_get_many(self, manifest_path):
+        reader = ManifestReader.open(manifest_path / "world_sql_en.content")
+        statements = []
+        reader.connection.set_trace_callback(statements.append)
+
+        definitions = reader.get_many(
+            "DestinyInventoryItemDefinition", [FRAME_HASH, EXOTIC_FRAME_HASH, FRAME_HASH, 404]
+        )
+
+        assert definitions[FRAME_HASH]["itemTypeDisplayName"] == "Intrinsic"
+        assert definitions[EXOTIC_FRAME_HASH]["hash"] == EXOTIC_FRAME_HASH
+        assert definitions[404] is None
+        assert len(statements) == 1
+        # Definitions read at once are cached like the others
+        assert reader.get("DestinyInventoryItemDefinition", FRAME_HASH) == definitions[FRAME_HASH]
+        assert reader.get_many("DestinyInventoryItemDefinition", [404]) == {404: None}
+        assert len(statements) == 1
+
+        with mock.patch("d2guessrlib.management.commands._manifest.SQLITE_MAX_VARIABLES", 1):
+            reader.get_many("DestinyInventoryItemDefinition", [10, 3000000000])
+        assert len(statements) == 3
+        reader.close()
+
+    def test_read_only(self, manifest_path):
+        reader = ManifestReader.open(manifest_path / "world_sql_en.content")
+        with pytest.raises(sqlite3.OperationalError):
+            reader.connection.execute("DELETE FROM DestinyInventoryItemDefinition")
+        reader.close()
+
+
+class TestClassifyItem:
+    def test_classify_item(self):
+        assert classify_item([1, 2, 5, 21, 20, 404]) == {
+            "itemTypeHash": 1,
+            "categoryHash": 5,
+            "classHash": 21,
+            "weaponSlotHash": 2,
+        }
+
+    def test_classify_items(self):
+        assert classify_items([[20, 47, 22], None]) == [
+            {"itemTypeHash": 20, "categoryHash": 47, "classHash": 22, "weaponSlotHash": None},
+            {"itemTypeHash": None, "categoryHash": None, "classHash": None, "weaponSlotHash": None},
+        ]
+
+    def test_hash_mapping_values_are_built_once(self):
+        assert STATS_HM.get_values() is STATS_HM.get_values()
+        assert STATS_HM.hashes == frozenset(STATS_HM.get_values())
+
+
+class TestStageScheduler:
+    def test_independent_stages_run_concurrently(self):
+        # Both stages wait for each other: they only end if they run at the same time
+        barrier = threading.Barrier(2, timeout=5)
+        order = []
+        scheduler = StageScheduler(max_workers=2)
+        scheduler.add("a", lambda: barrier.wait() or "a")
+        scheduler.add("b", lambda: barrier.wait() or "b")
+        scheduler.add("c", lambda: order.append("c"), requires=["a", "b"], main_thread=True)
+
+        results = scheduler.run()
+
+        assert results["a"] == "a"
+        assert order == ["c"]
+        assert scheduler.stages["c"].started >= max(scheduler.stages[name].ended for name in ("a", "b"))
+
+    def test_critical_path(self):
+        scheduler = StageScheduler()
+        scheduler.add("fast", lambda: None)
+        scheduler.add("slow", lambda: time.sleep(0.05))
+        scheduler.add("main", lambda: None, main_thread=True)
+        scheduler.add("last", lambda: None, requires=["fast", "slow", "main"], main_thread=True)
+
+        scheduler.run()
+
+        assert scheduler.critical_path() == ["slow", "last"]
+        assert [stage["name"] for stage in scheduler.report()] == ["fast", "slow", "main", "last"]
+
+    def test_errors_stop_the_schedule(self):
+        ran = []
+        scheduler = StageScheduler()
+        scheduler.add("failing", lambda: 1 / 0)
+        scheduler.add("after", lambda: ran.append("after"), requires=["failing"])
+
+        with pytest.raises(ZeroDivisionError):
+            scheduler.run()
+        assert not ran
+
+    def test_invalid_graph(self):
+        scheduler = StageScheduler()
+        scheduler.add("a", lambda: None, requires=["b"])
+        scheduler.add("b", lambda: None, requires=["a"])
+        with pytest.raises(ValueError):
+            scheduler.run()
+
+        scheduler = StageScheduler()
+        scheduler.add("a", lambda: None, requires=["unknown"])
+        with pytest.raises(ValueError):
+            scheduler.run()
+
+
+class TestManifestSet:
+    def test_open_databases_are_bounded(self, manifest_path):
+        for lang in ("de", "es"):
+            write_manifest(manifest_path / f"world_sql_{lang}.content", lang)
+        paths = {lang: manifest_path / f"world_sql_{lang}.content" for lang in ("en", "fr", "de", "es")}
+        manifests = ManifestSet(paths, max_open=2)
+        lock = threading.Lock()
+        open_count = [0, 0]
+
+        def read_name(lang_code, cursor):
+            with lock:
+                open_count[0] += 1
+                open_count[1] = max(open_count)
+            time.sleep(0.02)
+            ((name, _),) = load_item_translations(cursor, (FRAME_HASH,)).values()
+            with lock:
+                open_count[0] -= 1
+            return name
+
+        names = manifests.map(read_name, manifests.localized_languages)
+
+        assert names == {"de": "Frame (de)", "es": "Frame (es)", "fr": "Frame (fr)"}
+        assert open_count[1] == 2
+
+
+@pytest.mark.django_db
+class TestCatalogSnapshot:
+    def _catalog(self):
+        return {
+            model._meta.label_lower: sorted(
+                model.objects.values_list(*(f.attname for f in model._meta.concrete_fields))
+            )
+            for model in SNAPSHOT_MODELS
+            if model is not ContentTranslation
+        } | {
+            "translations": sorted(
+                ContentTranslation.objects.values_list(
+                    "content_type__model", "object_id", "language", "field_name", "text"
+                )
+            )
+        }
+
+    def test_export_and_import(self, manifest_path, tmp_path):
+        call_command("populate_db", use_local=True, local_path=str(manifest_path))
+        catalog = self._catalog()
+        snapshot_path = tmp_path / "catalog.jsonl.gz"
+
+        call_command("export_catalog", str(snapshot_path))
+        for model in reversed(SNAPSHOT_MODELS):
+            model.objects.all().delete()
+        call_command("import_catalog", str(snapshot_path), batch_size=1)
+
+        assert self._catalog() == catalog
+        assert Item.objects.count() == 2
+        assert CatalogVersion.current() == 2
+        # Sequences go on after the imported rows
+        assert Perk.objects.create(name="new", desc="new", id_bungie=404).pk > max(
+            pk for pk, *_ in catalog["d2guessrlib.perk"]
+        )
+
+    def test_import_needs_empty_catalog(self, manifest_path, tmp_path):
+        call_command("populate_db", use_local=True, local_path=str(manifest_path))
+        snapshot_path = tmp_path / "catalog.jsonl.gz"
+        call_command("export_catalog", str(snapshot_path))
+
+        with pytest.raises(CommandError, match="not empty"):
+            call_command("import_catalog", str(snapshot_path))
@@ -1,8 +1,12 @@
 import pytest
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory
 from django.urls import reverse
 from rest_framework.test import APIClient
 
-from d2guessrlib.models import Category, ClassType, DamageType, Item, Perk, StatType, TierType
+from d2guessrlib.cache import catalog_cache_page
+from d2guessrlib.models import CatalogVersion, Category, ClassType, DamageType, Item, Perk, StatType, TierType
 
 
 @pytest.mark.django_db
@@ -285,3 +289,24 @@ class TestViews:
             "localized_name": "type_de_dommages",
             "name": "damage_type",
         }
+
+
+@pytest.mark.django_db
+class TestCatalogCachePage:
+    def test_new_catalog_is_not_served_from_cache(self, settings):
+        settings.CATALOG_VERSION_TTL = 0
+        cache.clear()
+        calls = []
+
+        @catalog_cache_page(60 * 60)
+        def view(request):
+            calls.append(request)
+            return HttpResponse(str(len(calls)))
+
+        assert view(RequestFactory().get("/catalog/")).content == b"1"
+        assert view(RequestFactory().get("/catalog/")).content == b"1"
+
+        CatalogVersion.bump()
+
+        assert view(RequestFactory().get("/catalog/")).content == b"2"
+        assert view(RequestFactory().get("/catalog/")).content == b"2"